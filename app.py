@@ -1,15 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import login_required, current_user, LoginManager, login_user, logout_user, UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
 import random
+import time
 import requests
 import os
 import json
 import configparser
+from sqlalchemy import event
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.exc import IntegrityError
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from quiz_pool import QuizPool
+from sampler import AliasTable, WeightedSampler, RecentBitset, sample_distinct
+from media_cache import MediaCache
+from metrics import registry
+from profiler import ProfilingSettings
+from password_hashing import PasswordHasher, PasswordHasherBusy
 
 config = configparser.ConfigParser()
 config.read('quiz.config')
@@ -18,6 +26,25 @@ DATABASE = config.get('settings', 'database', fallback=os.getenv('DATABASE', 'WI
 DBPEDIA_SPARQL_QUERY = config.get('settings', 'dbpedia_sparql_query', fallback=os.getenv('DBPEDIA_SPARQL_QUERY'))
 WIKIDATA_SPARQL_QUERY = config.get('settings', 'wikidata_sparql_query', fallback=os.getenv('WIKIDATA_SPARQL_QUERY'))
 OPENAI_API_KEY = config.get('settings', 'openai_api_key', fallback=os.getenv('OPENAI_API_KEY'))
+DBPEDIA_SPARQL_ENDPOINT = config.get('settings', 'dbpedia_sparql_endpoint', fallback=os.getenv('DBPEDIA_SPARQL_ENDPOINT', 'https://dbpedia.org/sparql'))
+WIKIDATA_SPARQL_ENDPOINT = config.get('settings', 'wikidata_sparql_endpoint', fallback=os.getenv('WIKIDATA_SPARQL_ENDPOINT', 'https://query.wikidata.org/sparql'))
+DATABASE_URI = config.get('settings', 'database_uri', fallback=os.getenv('DATABASE_URI', 'sqlite:///quiz.db'))
+MEDIA_CACHE_DIR = config.get('settings', 'media_cache_dir', fallback=os.getenv('MEDIA_CACHE_DIR', 'media_cache'))
+MEDIA_MAX_AGE = int(config.get('settings', 'media_max_age', fallback=os.getenv('MEDIA_MAX_AGE', str(365 * 24 * 60 * 60))))
+QUIZ_TOKEN_MAX_AGE = int(config.get('settings', 'quiz_token_max_age', fallback=os.getenv('QUIZ_TOKEN_MAX_AGE', '3600')))
+PROFILE_DIR = config.get('settings', 'profile_dir', fallback=os.getenv('PROFILE_DIR', 'profiles'))
+PROFILE_SAMPLE_RATE = float(config.get('settings', 'profile_sample_rate', fallback=os.getenv('PROFILE_SAMPLE_RATE', '0.01')))
+PROFILE_SLOW_THRESHOLD_MS = float(config.get('settings', 'profile_slow_threshold_ms', fallback=os.getenv('PROFILE_SLOW_THRESHOLD_MS', '1000')))
+PROFILE_INTERVAL = float(config.get('settings', 'profile_interval', fallback=os.getenv('PROFILE_INTERVAL', '0.005')))
+QUIZ_POOL_SIZE = int(config.get('settings', 'quiz_pool_size', fallback=os.getenv('QUIZ_POOL_SIZE', '32')))
+REPORTED_QUESTION_WEIGHT = float(config.get('settings', 'reported_question_weight', fallback=os.getenv('REPORTED_QUESTION_WEIGHT', '0.2')))
+WEAK_CATEGORY_BOOST = float(config.get('settings', 'weak_category_boost', fallback=os.getenv('WEAK_CATEGORY_BOOST', '2.0')))
+RECENT_QUESTIONS_LIMIT = int(config.get('settings', 'recent_questions_limit', fallback=os.getenv('RECENT_QUESTIONS_LIMIT', '48')))
+PASSWORD_HASH_METHOD = config.get('settings', 'password_hash_method', fallback=os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000'))
+PASSWORD_SALT_LENGTH = int(config.get('settings', 'password_salt_length', fallback=os.getenv('PASSWORD_SALT_LENGTH', '16')))
+PASSWORD_HASH_WORKERS = int(config.get('settings', 'password_hash_workers', fallback=os.getenv('PASSWORD_HASH_WORKERS', '1')))
+PASSWORD_HASH_QUEUE = int(config.get('settings', 'password_hash_queue', fallback=os.getenv('PASSWORD_HASH_QUEUE', '8')))
+PASSWORD_HASH_TIMEOUT = float(config.get('settings', 'password_hash_timeout', fallback=os.getenv('PASSWORD_HASH_TIMEOUT', '10')))
 
 OPTIONS = ["capital_label", "currency_label",
            "population", "flag_label", 
@@ -25,12 +52,36 @@ OPTIONS = ["capital_label", "currency_label",
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.urandom(24)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///quiz.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
 
 db = SQLAlchemy(app)
+quiz_token_serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='quiz-api')
 session_factory = sessionmaker(bind=db.engine)
 Session = scoped_session(session_factory)
 
+request_latency = registry.histogram('quiz_http_request_duration_seconds', 'Latency of HTTP requests by route.')
+request_db_queries = registry.histogram('quiz_http_request_db_queries', 'Database queries executed per HTTP request.', buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+sparql_fetch_latency = registry.histogram('quiz_sparql_fetch_duration_seconds', 'Duration of SPARQL queries to the semantic databases.')
+sparql_payload_bytes = registry.histogram('quiz_sparql_payload_bytes', 'Size of SPARQL query responses.', buckets=(1e4, 1e5, 1e6, 1e7, 1e8))
+quiz_generation_latency = registry.histogram('quiz_generation_duration_seconds', 'Duration of quiz generation.')
+snapshot_reload_latency = registry.histogram('quiz_snapshot_reload_duration_seconds', 'Duration of country data snapshot reloads.')
+slow_requests = registry.counter('quiz_http_slow_requests_total', 'Requests slower than the profiling threshold, counted while profiling is enabled.')
+
+# Hashing de senhas fora das threads das requisições, com no máximo PASSWORD_HASH_QUEUE operações aceitas por processo
+password_hasher = PasswordHasher(PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, PASSWORD_HASH_TIMEOUT)
+registry.callback('quiz_password_hash_in_flight', 'Password hashing operations accepted and not yet finished.', 'gauge', lambda: password_hasher.stats()['in_flight'])
+registry.callback('quiz_password_hash_completed_total', 'Password hashing operations completed.', 'counter', lambda: password_hasher.stats()['completed_total'])
+registry.callback('quiz_password_hash_rejected_total', 'Password hashing operations rejected because the pool was full.', 'counter', lambda: password_hasher.stats()['rejected_total'])
+registry.callback('quiz_password_hash_seconds_total', 'Time spent computing password hashes.', 'counter', lambda: password_hasher.stats()['seconds_total'])
+
+# Perfilamento sob demanda, ligado por processo em /admin/profiling
+profiling = ProfilingSettings(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_SLOW_THRESHOLD_MS, PROFILE_INTERVAL)
+
+@event.listens_for(db.engine, "before_cursor_execute")
+def count_request_queries(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+
 class User(UserMixin, db.Model):
     """Modelo de usuário para o banco de dados SQLAlchemy."""
     id = db.Column(db.Integer, primary_key=True)
@@ -92,6 +143,32 @@ class CountryQuizUpdatesHistory(db.Model):
     new_data = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+class CountryQuizUpdatesHistoryRollup(db.Model):
+    """Modelo compacto do histórico: consolida eventos antigos em uma linha por (país, chave), com código de evento inteiro."""
+    __table_args__ = (db.UniqueConstraint('country_label', 'key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    event_code = db.Column(db.SmallInteger, nullable=False)  # Código do último evento consolidado
+    country_label = db.Column(db.String(255), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    old_data = db.Column(db.Text, nullable=False)  # Valor anterior ao primeiro evento consolidado
+    new_data = db.Column(db.Text, nullable=False)  # Valor após o último evento consolidado
+    events_count = db.Column(db.Integer, nullable=False, default=0)
+    first_timestamp = db.Column(db.DateTime)
+    last_timestamp = db.Column(db.DateTime)
+
+class QuizToken(db.Model):
+    """Modelo para registrar os quizzes da API já submetidos, impedindo que um mesmo token seja usado duas vezes."""
+    id = db.Column(db.Integer, primary_key=True)
+    nonce = db.Column(db.String(32), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class SyncState(db.Model):
+    """Modelo para registrar os marcos das sincronizações com as bases de dados semânticas."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), unique=True, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 with app.app_context():
     db.create_all()
 
@@ -99,11 +176,52 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    if profiling.enabled and random.random() < profiling.sample_rate:
+        g.profile = profiling.sampler.start(f"{request.method} {request.endpoint or 'unmatched'}")
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    if 'request_started' in g:
+        duration = time.perf_counter() - g.request_started
+        request_latency.observe(duration, route=route, method=request.method, status=response.status_code)
+        request_db_queries.observe(g.get('db_queries', 0), route=route)
+        if profiling.enabled and duration * 1000 >= profiling.slow_threshold_ms:
+            slow_requests.inc(route=route)
+            print(f"Slow request: {request.method} {request.path} took {duration * 1000:.0f} ms")
+    return response
+
+@app.teardown_request
+def finish_request_profile(exception):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        duration = profiling.sampler.stop(profile)
+        profile.write(profiling.directory, duration, slow=duration * 1000 >= profiling.slow_threshold_ms)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
 database = DATABASE
+media_cache = MediaCache(MEDIA_CACHE_DIR)
+
+def media_url(url):
+    """Retorna o endereço local de uma mídia já baixada para o cache, ou a URL original caso contrário.
+
+    Args:
+        url (str): URL original da bandeira ou do hino.
+
+    Returns:
+        str: URL a ser usada na página.
+    """
+    filename = media_cache.lookup(url) if url.startswith(('http://', 'https://')) else None
+    if filename:
+        return url_for('media', filename=filename)
+    return url
 
 def unify_country_data(data):
     """Unifica dados de entrada para um país, combinando entradas duplicadas ou fragmentadas.
@@ -196,30 +314,71 @@ def format_population(number):
     else:
         return str(number)
 
-def get_country_data():
+def filter_query_by_modification(query, modified_since):
+    """Restringe uma consulta SPARQL do Wikidata a países cuja entidade foi modificada após uma data.
+
+    Args:
+        query (str): Consulta SPARQL original, com a variável ?country.
+        modified_since (datetime): Data (UTC) a partir da qual as modificações interessam.
+
+    Returns:
+        str: Consulta filtrada por schema:dateModified, ou None se a consulta não puder ser filtrada.
+    """
+    if "WHERE {" not in query:
+        return None
+    prefixes = "PREFIX schema: <http://schema.org/> PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> "
+    modified_filter = (f"?country schema:dateModified ?date_modified . "
+                       f"FILTER (?date_modified > \"{modified_since.strftime('%Y-%m-%dT%H:%M:%SZ')}\"^^xsd:dateTime) ")
+    return prefixes + query.replace("WHERE {", "WHERE { " + modified_filter, 1)
+
+def fetch_sparql(url, query, source):
+    """Executa uma consulta SPARQL, registrando a duração e o tamanho da resposta.
+
+    Args:
+        url (str): Endpoint SPARQL.
+        query (str): Consulta a ser executada.
+        source (str): Nome da base consultada, usado como rótulo das métricas.
+
+    Returns:
+        list: Linhas ('bindings') da resposta.
+    """
+    started = time.perf_counter()
+    response = requests.get(url, params={"query": query, "format": "json"})
+    sparql_fetch_latency.observe(time.perf_counter() - started, source=source)
+    sparql_payload_bytes.observe(len(response.content), source=source)
+    return response.json()["results"]["bindings"]
+
+def get_country_data(modified_since=None):
     """Recupera dados de países usando consultas SPARQL de fontes externas como DBpedia e Wikidata.
 
+    Args:
+        modified_since (datetime, optional): Se informado, busca no Wikidata apenas os países modificados após essa data.
+
     Returns:
         list: Lista de dicionários contendo dados de países.
     """
     query_dbpedia = DBPEDIA_SPARQL_QUERY
     query_wikidata = WIKIDATA_SPARQL_QUERY
+    if modified_since is not None:
+        if database != "WIKIDATA":
+            raise ValueError("Incremental queries are only supported for WIKIDATA")
+        query_wikidata = filter_query_by_modification(query_wikidata, modified_since)
+        if query_wikidata is None:
+            raise ValueError("WIKIDATA_SPARQL_QUERY cannot be filtered by modification date")
     if database == "DBPEDIA":
-        url = "https://dbpedia.org/sparql"
+        url = DBPEDIA_SPARQL_ENDPOINT
         query = query_dbpedia
     if database == "WIKIDATA":
-        url = "https://query.wikidata.org/sparql"
+        url = WIKIDATA_SPARQL_ENDPOINT
         query = query_wikidata
     if database == "BOTH":
-        url = "https://query.wikidata.org/sparql"
+        url = WIKIDATA_SPARQL_ENDPOINT
         query = query_wikidata
-    response = requests.get(url, params={"query": query, "format": "json"})
-    data = response.json()["results"]["bindings"]
+    data = fetch_sparql(url, query, "dbpedia" if database == "DBPEDIA" else "wikidata")
     if database == "BOTH":
-        url = "https://dbpedia.org/sparql"
+        url = DBPEDIA_SPARQL_ENDPOINT
         query = query_dbpedia
-        response2 = requests.get(url, params={"query": query, "format": "json"})
-        data2 = response2.json()["results"]["bindings"]
+        data2 = fetch_sparql(url, query, "dbpedia")
         combined_data = join_data(data, data2)
         data = combined_data
     for country in data:
@@ -265,6 +424,18 @@ def get_country_data():
             country['highest_point_label'] = {'value': ''}
     unified_country_data = unify_country_data(data)
     country_data = unified_country_data
+    register_country_blanks(country_data)
+    return country_data
+
+def register_country_blanks(country_data):
+    """Registra em CountryBlanksFromSemanticDatabase as propriedades em branco dos países, para preenchimento via IA.
+
+    Args:
+        country_data (list): Lista de dicionários contendo dados de países unificados.
+
+    Returns:
+        dict: Número de lacunas novas registradas por propriedade.
+    """
     counters = {
         'flag_image': 0,
         'currency_label': 0,
@@ -306,7 +477,7 @@ def get_country_data():
                       db.session.add(review)
                       counters[key] += 1
             db.session.commit()
-    return country_data
+    return counters
     
 def select_country_data(all_data_int, kind_of_questions_int):
     """Seleciona dados específicos de um conjunto maior de dados de países para uso em quizzes.
@@ -324,51 +495,302 @@ def select_country_data(all_data_int, kind_of_questions_int):
     ]
     return country_data_int
 
+def index_countries(data):
+    """Mapeia o nome de cada país para sua posição nos dados de países.
+
+    Args:
+        data (list): Lista de dados de países.
+
+    Returns:
+        dict: Posição de cada país, indexada pelo nome.
+    """
+    return {entry["country_label"]["value"]: position for position, entry in enumerate(data)}
+
+def question_weight(entry, kind_of_questions, reported_countries):
+    """Calcula o peso de um país no sorteio de um tipo de questão.
+
+    Args:
+        entry (dict): Dados do país.
+        kind_of_questions (str): Tipo de questão.
+        reported_countries (set): Países com reportações ainda não resolvidas.
+
+    Returns:
+        float: Zero se o país não tem o dado pedido pelo tipo de questão, um peso reduzido se ele tem
+        reportações abertas e 1 nos demais casos.
+    """
+    if kind_of_questions == "flag_label":
+        eligible = entry["flag_image"]["value"] != "./static/images/no_flag.png"
+    else:
+        eligible = entry.get(kind_of_questions, {}).get("value", '') != ''
+    if not eligible:
+        return 0.0
+    return REPORTED_QUESTION_WEIGHT if entry["country_label"]["value"] in reported_countries else 1.0
+
+def open_reported_countries():
+    """Retorna os países com perguntas reportadas ainda não resolvidas."""
+    return {country for (country,) in db.session.query(ReportedQuestion.country).filter(ReportedQuestion.value_updated == False).distinct()}
+
+def build_question_catalog(data, reported_countries):
+    """Prepara as estruturas de sorteio de perguntas de uma versão dos dados de países.
+
+    Args:
+        data (list): Lista de dados de países.
+        reported_countries (set): Países com reportações ainda não resolvidas.
+
+    Returns:
+        dict: Dados de países, posição de cada país, um sorteador ponderado de países por tipo de questão e
+        os valores distintos de cada tipo de questão, usados como alternativas erradas.
+    """
+    return {
+        "data": data,
+        "index": index_countries(data),
+        "samplers": {kind: WeightedSampler([question_weight(entry, kind, reported_countries) for entry in data]) for kind in OPTIONS},
+        "option_values": {kind: sorted({entry.get(kind, {}).get("value", '') for entry in data} - {''}) for kind in OPTIONS},
+    }
+
 all_data = request_or_load_country_data()
+country_index = index_countries(all_data)
+question_catalog = build_question_catalog(all_data, open_reported_countries())
+snapshot_version = 1  # Incrementada a cada recarga de 'all_data'
 
-def generate_quiz():
-    """Gera um conjunto de perguntas para um quiz a partir de dados de países.
+def choose_options(question, correct_answer, kind_of_questions):
+    """Sorteia as alternativas erradas de uma pergunta e formata as opções exibidas.
+
+    Args:
+        question (str): País ao qual a pergunta se refere.
+        correct_answer (str): Resposta correta da pergunta.
+        kind_of_questions (str): Tipo de questão.
+
+    Returns:
+        list: Lista embaralhada de dicionários com o valor e o texto exibido de cada opção.
+    """
+    wrong_options = sample_distinct(question_catalog["option_values"][kind_of_questions], 2, excluded=[correct_answer])
+    options = wrong_options + [correct_answer]
+    # Populações com mais de um valor ou fora do formato numérico são exibidas como estão
+    if kind_of_questions == "population" and all(option.isdigit() for option in options):
+        options_with_format = [{"value": option, "display": format_population(int(option))} for option in options]
+    else:
+        options_with_format = [{"value": option, "display": option} for option in options]
+    random.shuffle(options_with_format)
+    return options_with_format
+
+def build_question_text(question, kind_of_questions):
+    """Monta o enunciado de uma pergunta.
+
+    Args:
+        question (str): País ao qual a pergunta se refere.
+        kind_of_questions (str): Tipo de questão.
 
     Returns:
-        list: Lista de perguntas geradas para o quiz.
+        str: Texto da pergunta exibido ao usuário.
     """
+    if kind_of_questions == "capital_label":
+        return f"What is the capital of (the) {question}?"
+    elif kind_of_questions == "currency_label":
+        return f"What is the currency of (the) {question}?"
+    elif kind_of_questions == "population":
+        return f"What is the population of (the) {question}?"
+    elif kind_of_questions == "official_Language_label":
+        return f"What is the official language of (the) {question}?"
+    elif kind_of_questions == "continent_label":
+        return f"Which continent does (the) {question} belong to?"
+    elif kind_of_questions == "highest_point_label":
+        return f"What is the highest point in (the) {question}?"
+    else:
+        return f"Which country does this flag belong to?"
+
+def quiz_kinds():
+    """Retorna os tipos de questão disponíveis para a base de dados configurada."""
+    return OPTIONS[:5] if database == "DBPEDIA" else OPTIONS
+
+def generate_question(catalog, kind_of_questions, exclude=None):
+    """Sorteia uma pergunta de um tipo de questão, já com as opções, em tempo constante.
+
+    Args:
+        catalog (dict): Catálogo de perguntas, como retornado por build_question_catalog().
+        kind_of_questions (str): Tipo de questão.
+        exclude (callable, optional): Função que recebe a posição de um país e indica se ele deve ser evitado.
+
+    Returns:
+        tuple: Dados do país, tipo de questão e opções, ou None se todos os países elegíveis foram excluídos.
+    """
+    position = catalog["samplers"][kind_of_questions].sample(exclude=exclude)
+    if position is None:
+        return None
+    question = select_country_data([catalog["data"][position]], kind_of_questions)[0]
+    return question, kind_of_questions, choose_options(question[0], question[1], kind_of_questions)
+
+def draw_question(catalog, kind_of_questions, asked, recent):
+    """Sorteia uma pergunta que não repete uma pergunta do quiz e, sempre que possível, um país recente.
+
+    Args:
+        catalog (dict): Catálogo de perguntas.
+        kind_of_questions (str): Tipo de questão.
+        asked (set): Pares (posição do país, tipo de questão) já presentes no quiz.
+        recent (RecentBitset): Países perguntados recentemente ao usuário.
+
+    Returns:
+        tuple: Pergunta no formato de generate_question(), ou None se não houver país possível.
+    """
+    entry = generate_question(catalog, kind_of_questions, lambda index: (index, kind_of_questions) in asked or index in recent)
+    if entry is None:
+        # Quase todos os países elegíveis já foram perguntados recentemente a este usuário
+        entry = generate_question(catalog, kind_of_questions, lambda index: (index, kind_of_questions) in asked)
+    return entry
+
+def assemble_quiz(catalog, kind_weights, recent, pool=None):
+    """Monta as perguntas de um quiz, sorteando o tipo de cada uma por uma tabela de alias.
+
+    Um tipo sem pergunta possível (sem países elegíveis ou com todos já usados no quiz) é trocado por outro
+    tipo; se nenhum tipo tiver pergunta, o quiz fica com menos perguntas.
+
+    Args:
+        catalog (dict): Catálogo de perguntas.
+        kind_weights (list): Peso de cada tipo de questão, na ordem de quiz_kinds(), ou None para pesos iguais.
+        recent (RecentBitset): Países perguntados recentemente ao usuário, evitados sempre que possível.
+        pool (QuizPool, optional): Reserva de onde as perguntas são retiradas antes de serem geradas na hora.
+
+    Returns:
+        list: Perguntas no formato de generate_question().
+    """
+    kinds = quiz_kinds()
+    kind_table = AliasTable(kind_weights or [1.0] * len(kinds))
     quiz = []
+    asked = set()
+    unavailable = set()
+
+    def accept(entry):
+        position = catalog["index"].get(entry[0][0])
+        return (position, entry[1]) not in asked and position not in recent
+
+    def pick(kind_of_questions):
+        if kind_of_questions in unavailable:
+            return None
+        entry = (pool.take(kind_of_questions, accept) if pool is not None else None) or draw_question(catalog, kind_of_questions, asked, recent)
+        if entry is None:
+            unavailable.add(kind_of_questions)
+        return entry
+
     for _ in range(6):
-        if database == "DBPEDIA":
-          kind_of_questions = OPTIONS[random.randint(0, 4)]
-        else:
-            kind_of_questions = OPTIONS[random.randint(0, 6)]
-        country_data = select_country_data(all_data, kind_of_questions)
-        question = random.choice(country_data)
-        if kind_of_questions == "flag_label":
-          while (question[2] == ("./static/images/no_flag.png" or './static/images/no_flag.png')) or ((question, kind_of_questions) in quiz):
-            question = random.choice(country_data)
-        if kind_of_questions == "currency_label":
-          while (question[1] == '') or ((question, kind_of_questions) in quiz):
-            question = random.choice(country_data)
-        if kind_of_questions == "population":
-          while (question[1] == '') or ((question, kind_of_questions) in quiz):
-            question = random.choice(country_data)
-        if kind_of_questions == "capital_label":
-          while (question[1] == '') or ((question, kind_of_questions) in quiz):
-            question = random.choice(country_data)
-        if kind_of_questions == "official_Language_label":
-          while (question[1] == '') or ((question, kind_of_questions) in quiz):
-            question = random.choice(country_data)
-        if kind_of_questions == "continent_label":
-          while (question[1] == '') or ((question, kind_of_questions) in quiz):
-            question = random.choice(country_data)
-        if kind_of_questions == "highest_point_label":
-          while (question[1] == '') or ((question, kind_of_questions) in quiz):
-            question = random.choice(country_data)
-        quiz.append((question, kind_of_questions))
+        entry = pick(kinds[kind_table.sample()])
+        if entry is None:
+            entry = next((entry for entry in map(pick, random.sample(kinds, len(kinds))) if entry is not None), None)
+            if entry is None:
+                break
+        asked.add((catalog["index"].get(entry[0][0]), entry[1]))
+        quiz.append(entry)
+    return quiz
+
+def generate_quiz(kind_weights=None, recent=None):
+    """Gera um conjunto de perguntas para um quiz a partir de dados de países.
+
+    Cada pergunta é sorteada em tempo constante, independentemente do número de países: o tipo de questão
+    por uma tabela de alias e o país pelo sorteador ponderado do tipo.
+
+    Args:
+        kind_weights (list, optional): Peso de cada tipo de questão, na ordem de quiz_kinds(); por padrão, todos iguais.
+        recent (RecentBitset, optional): Países perguntados recentemente ao usuário, evitados sempre que possível.
+
+    Returns:
+        list: Lista de perguntas geradas para o quiz, cada uma com os dados do país, o tipo de questão e as opções já sorteadas.
+    """
+    started = time.perf_counter()
+    # Referência única ao catálogo, caso os dados sejam recarregados durante a geração
+    quiz = assemble_quiz(question_catalog, kind_weights, recent if recent is not None else ())
+    quiz_generation_latency.observe(time.perf_counter() - started)
     return quiz
 
+def weak_category_weights(kind_stats):
+    """Calcula o peso de cada tipo de questão para um usuário, favorecendo os tipos em que ele mais erra.
+
+    Args:
+        kind_stats (dict): Perguntas respondidas e erradas por tipo de questão, no formato {tipo: [respondidas, erradas]}.
+
+    Returns:
+        list: Peso de cada tipo de questão, na ordem de quiz_kinds(), ou None se o usuário ainda não completou um quiz.
+    """
+    if WEAK_CATEGORY_BOOST <= 0 or not kind_stats or sum(answered for answered, _ in kind_stats.values()) < 6:
+        return None
+    weights = []
+    for kind_of_questions in quiz_kinds():
+        answered, missed = kind_stats.get(kind_of_questions, [0, 0])
+        # Taxa de erro suavizada: um tipo ainda não respondido conta como 50% de erro
+        weights.append(1.0 + WEAK_CATEGORY_BOOST * (missed + 1) / (answered + 2))
+    return weights
+
+def record_answer(kind_of_questions, correct):
+    """Acumula na sessão o desempenho do usuário por tipo de questão."""
+    kind_stats = session.get("kind_stats", {})
+    answered, missed = kind_stats.get(kind_of_questions, [0, 0])
+    kind_stats[kind_of_questions] = [answered + 1, missed + (0 if correct else 1)]
+    session["kind_stats"] = kind_stats
+
+def recent_questions():
+    """Lê da sessão os países perguntados recentemente ao usuário, descartando-os se os dados de países foram recarregados."""
+    version, bits = session.get("recent_questions", [None, ""])
+    return RecentBitset.from_hex(bits if version == snapshot_version else "", RECENT_QUESTIONS_LIMIT)
+
+def new_quiz():
+    """Monta um quiz para o usuário da sessão com perguntas do pool.
+
+    O tipo de cada pergunta é sorteado pela tabela de alias dos pesos do usuário, que favorece os tipos em que
+    ele mais erra. A pergunta é retirada do pool desse tipo, pulando as de países perguntados recentemente e as
+    que repetiriam uma pergunta do quiz; só quando o pool não tem pergunta aceitável ela é gerada na hora.
+
+    Returns:
+        list: Quiz no mesmo formato de generate_quiz().
+    """
+    started = time.perf_counter()
+    catalog = question_catalog
+    recent = recent_questions()
+    quiz_data = assemble_quiz(catalog, weak_category_weights(session.get("kind_stats")), recent, quiz_pool)
+    for question, _, _ in quiz_data:
+        if question[0] in catalog["index"]:
+            recent.add(catalog["index"][question[0]])
+    session["recent_questions"] = [snapshot_version, recent.to_hex()]
+    quiz_generation_latency.observe(time.perf_counter() - started)
+    return quiz_data
+
+def refresh_country_weight(country_label):
+    """Recalcula o peso de um país em todos os tipos de questão após a abertura ou o encerramento de uma reportação.
+
+    A atualização é incremental e vale apenas para este processo; os demais a recebem na próxima recarga dos dados.
+
+    Args:
+        country_label (str): Nome do país.
+    """
+    catalog = question_catalog
+    position = catalog["index"].get(country_label)
+    if position is None:
+        return
+    reported = ReportedQuestion.query.filter_by(country=country_label, value_updated=False).first() is not None
+    for kind_of_questions, sampler in catalog["samplers"].items():
+        sampler.update(position, question_weight(catalog["data"][position], kind_of_questions, {country_label} if reported else set()))
+
+quiz_pool = QuizPool(lambda kind_of_questions: generate_question(question_catalog, kind_of_questions), lambda: snapshot_version, quiz_kinds(), size=QUIZ_POOL_SIZE)
+registry.callback('quiz_pool_depth', 'Questions ready in the pool of this worker.', 'gauge', lambda: quiz_pool.stats()['depth'])
+registry.callback('quiz_pool_refill_rate', 'Questions added to the pool per second over the last minute.', 'gauge', lambda: quiz_pool.stats()['refill_rate'])
+registry.callback('quiz_pool_generated_total', 'Questions generated by the pool refill thread.', 'counter', lambda: quiz_pool.stats()['generated_total'])
+registry.callback('quiz_pool_served_total', 'Questions served from the pool.', 'counter', lambda: quiz_pool.stats()['served_total'])
+registry.callback('quiz_pool_misses_total', 'Questions generated inline because the pool had none acceptable for the user.', 'counter', lambda: quiz_pool.stats()['misses_total'])
+registry.callback('quiz_pool_invalidated_total', 'Pooled questions discarded after a country data reload.', 'counter', lambda: quiz_pool.stats()['invalidated_total'])
+
+def reload_country_snapshot():
+    """Recarrega os dados de países em memória e descarta os quizzes gerados a partir da versão anterior."""
+    global all_data, country_index, question_catalog, snapshot_version
+    started = time.perf_counter()
+    data = request_or_load_country_data()
+    catalog = build_question_catalog(data, open_reported_countries())
+    all_data, country_index, question_catalog = data, catalog["index"], catalog
+    snapshot_version += 1
+    quiz_pool.invalidate()
+    snapshot_reload_latency.observe(time.perf_counter() - started)
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         if "quiz_data" not in session or not session["quiz_data"]:
-            session["quiz_data"] = generate_quiz()
+            session["quiz_data"] = new_quiz()
         if "score" not in session or not session["score"]:
             session["score"] = 0
         if "before_question_text" not in session or not session["before_question_text"]:
@@ -378,15 +800,27 @@ def login():
         if "user_answers" not in session or not session["user_answers"]:
             session["user_answers"] = []
         return redirect(url_for('quiz'))
+    status = 200
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
+        authenticated, new_hash = False, None
+        if user:
+            try:
+                authenticated, new_hash = password_hasher.verify_and_update(user.password, password)
+            except PasswordHasherBusy:
+                status = 503
+        if authenticated:
+            if new_hash:
+                user.password = new_hash
+                db.session.commit()
+            session.pop("kind_stats", None)
+            session.pop("recent_questions", None)
             session['user_id'] = user.id
             login_user(user)
             if "quiz_data" not in session or not session["quiz_data"]:
-                session["quiz_data"] = generate_quiz()
+                session["quiz_data"] = new_quiz()
             if "score" not in session or not session["score"]:
                 session["score"] = 0
             if "before_question_text" not in session or not session["before_question_text"]:
@@ -396,9 +830,12 @@ def login():
             if "user_answers" not in session or not session["user_answers"]:
                 session["user_answers"] = []
             return redirect(url_for('quiz'))
-        flash('Invalid username or password')
+        if status == 503:
+            flash('Too many logins right now, please try again in a moment')
+        else:
+            flash('Invalid username or password')
     top_scores = User.query.order_by(User.score.desc()).limit(10).all()
-    return render_template('login.html', top_scores=top_scores)
+    return render_template('login.html', top_scores=top_scores), status, {'Retry-After': '1'} if status == 503 else {}
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -412,8 +849,13 @@ def register():
             return redirect(url_for('register'))
         user = User.query.filter_by(username=username).first()
         if not user:
+            try:
+                password_hash = password_hasher.hash(password)
+            except PasswordHasherBusy:
+                flash('Too many requests right now, please try again in a moment')
+                return render_template('register.html'), 503, {'Retry-After': '1'}
             new_user = User(username=username,
-                            password=generate_password_hash(password),
+                            password=password_hash,
                             email=email,
                             timestamp=datetime.utcnow())
             db.session.add(new_user)
@@ -427,6 +869,9 @@ def register():
 def logout():
     session.pop("quiz_data", [])
     session.pop('user_id', None)
+    # O desempenho por tipo e os países recentes são do usuário, não do navegador
+    session.pop("kind_stats", None)
+    session.pop("recent_questions", None)
     logout_user()
     return redirect(url_for('login'))
 
@@ -434,7 +879,7 @@ def logout():
 def home():
     if current_user.is_authenticated:
         if "quiz_data" not in session or not session["quiz_data"]:
-            session["quiz_data"] = generate_quiz()
+            session["quiz_data"] = new_quiz()
         if "score" not in session or not session["score"]:
             session["score"] = 0
         if "before_question_text" not in session or not session["before_question_text"]:
@@ -453,7 +898,7 @@ def quiz():
         return redirect(url_for('login'))
     else:
         if "quiz_data" not in session or not session["quiz_data"]:
-            session["quiz_data"] = generate_quiz()
+            session["quiz_data"] = new_quiz()
         if "score" not in session or not session["score"]:
             session["score"] = 0
         if "before_question_text" not in session or not session["before_question_text"]:
@@ -480,11 +925,13 @@ def quiz():
             (before_question_text, user_answer, ca[1]))
         if user_answer == ca[1]:
             score += 1
+        record_answer(quiz_data[0][1], user_answer == ca[1])
         if request.form.get("wrong_answers"):
             reported_question = ReportedQuestion(
                 user_id=current_user.id, question=before_question_text, country=before_country, correct_answer=correct_value, value_from_ai="", approved=False, value_updated=False, timestamp=datetime.utcnow())
             db.session.add(reported_question)
             db.session.commit()
+            refresh_country_weight(before_country)
         quiz_data.pop(0)
         if not quiz_data:
             session["quiz_data"] = quiz_data
@@ -494,36 +941,17 @@ def quiz():
             session["user_answers"] = user_answers
             return redirect(url_for("result"))
     if not quiz_data:
-        quiz_data = generate_quiz()
-    (question, correct_answer, flag_image_url, anthem_audio), kind_of_questions = quiz_data[0]
+        quiz_data = new_quiz()
+    (question, correct_answer, flag_image_url, anthem_audio), kind_of_questions = quiz_data[0][:2]
     if anthem_audio == "no_audio":
         anthem_audio = ""
     else:
-        anthem_audio = "<audio controls='controls'><source src='" + anthem_audio + "' type='audio/ogg' />seu navegador não suporta HTML5</audio>"
-    country_data = select_country_data(all_data, kind_of_questions)
-    country_data = [t for t in country_data if t[1] != '']
-    wrong_options = random.sample(
-        list(set([country[1] for country in country_data if (country[1] != correct_answer) and (country[0] != question)])), 2)
-    options = wrong_options + [correct_answer]
-    if kind_of_questions == "population" and all(" or " not in option for option in options):
-        options_with_format = [{"value": option, "display": format_population(int(option))} for option in options]
-    else:
-        options_with_format = [{"value": option, "display": option} for option in options]
-    random.shuffle(options_with_format)
-    if kind_of_questions == "capital_label":
-        question_text = f"What is the capital of (the) {question}?"
-    elif kind_of_questions == "currency_label":
-        question_text = f"What is the currency of (the) {question}?"
-    elif kind_of_questions == "population":
-        question_text = f"What is the population of (the) {question}?"
-    elif kind_of_questions == "official_Language_label":
-        question_text = f"What is the official language of (the) {question}?"
-    elif kind_of_questions == "continent_label":
-        question_text = f"Which continent does (the) {question} belong to?"
-    elif kind_of_questions == "highest_point_label":
-        question_text = f"What is the highest point in (the) {question}?"
+        anthem_audio = "<audio controls='controls'><source src='" + media_url(anthem_audio) + "' type='audio/ogg' />seu navegador não suporta HTML5</audio>"
+    if len(quiz_data[0]) > 2:
+        options_with_format = quiz_data[0][2]
     else:
-        question_text = f"Which country does this flag belong to?"
+        options_with_format = choose_options(question, correct_answer, kind_of_questions)
+    question_text = build_question_text(question, kind_of_questions)
     before_question_text = question_text
     before_country = question
     session["quiz_data"] = quiz_data
@@ -531,7 +959,15 @@ def quiz():
     session["before_question_text"] = before_question_text
     session["before_country"] = before_country
     session["user_answers"] = user_answers
-    return render_template("quiz.html", question=question_text, options_with_format=options_with_format, correct_answer=correct_answer, flag_image_url=flag_image_url, anthem_audio=anthem_audio)
+    return render_template("quiz.html", question=question_text, options_with_format=options_with_format, correct_answer=correct_answer, flag_image_url=media_url(flag_image_url), anthem_audio=anthem_audio)
+
+@app.route("/media/<path:filename>")
+def media(filename):
+    return send_from_directory(media_cache.cache_dir, filename, max_age=MEDIA_MAX_AGE, etag=True, conditional=True)
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 @app.route("/result")
 @login_required
@@ -548,6 +984,80 @@ def result():
     session.pop("user_answers", [])
     return render_template("result.html", score=total_score, user_answers=result_data)
 
+@app.route("/api/quiz")
+def api_quiz():
+    if not current_user.is_authenticated:
+        return jsonify(error="Authentication required"), 401
+    quiz_data = new_quiz()
+    questions = []
+    for (question, correct_answer, flag_image_url, anthem_audio), kind_of_questions, options_with_format in quiz_data:
+        questions.append({
+            "question": build_question_text(question, kind_of_questions),
+            "options": options_with_format,
+            "flag_image": media_url(flag_image_url),
+            "anthem_audio": None if anthem_audio == "no_audio" else media_url(anthem_audio),
+        })
+    # O token guarda só a posição de cada país nos dados da versão atual, sem revelar as respostas
+    token = quiz_token_serializer.dumps({
+        "u": current_user.id,
+        "v": snapshot_version,
+        "n": os.urandom(16).hex(),
+        "q": [[country_index[question[0]], kind_of_questions] for question, kind_of_questions, _ in quiz_data],
+    })
+    return jsonify(token=token, questions=questions)
+
+@app.route("/api/quiz/submit", methods=["POST"])
+def api_quiz_submit():
+    if not current_user.is_authenticated:
+        return jsonify(error="Authentication required"), 401
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("token"), str):
+        return jsonify(error="Expected a JSON object with a string token"), 400
+    try:
+        token = quiz_token_serializer.loads(payload["token"], max_age=QUIZ_TOKEN_MAX_AGE)
+    except BadSignature:
+        return jsonify(error="Invalid or expired token"), 400
+    if token["u"] != current_user.id:
+        return jsonify(error="Token belongs to another user"), 403
+    if token["v"] != snapshot_version:
+        return jsonify(error="Country data changed, request a new quiz"), 409
+    answers = payload.get("answers")
+    reports = payload.get("reports", [])
+    if not isinstance(answers, list) or len(answers) != len(token["q"]):
+        return jsonify(error="Expected one answer per question"), 400
+    # bool é subclasse de int, mas true/false não são posições de perguntas
+    if not isinstance(reports, list) or not all(type(report) is int and 0 <= report < len(answers) for report in reports):
+        return jsonify(error="Expected reports to be a list of question positions"), 400
+    db.session.add(QuizToken(nonce=token["n"], user_id=current_user.id, timestamp=datetime.utcnow()))
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(error="Quiz already submitted"), 409
+    score = 0
+    results = []
+    reported_countries = set()
+    for position, ((country_position, kind_of_questions), user_answer) in enumerate(zip(token["q"], answers)):
+        question, correct_answer, flag_image_url, _ = select_country_data([all_data[country_position]], kind_of_questions)[0]
+        question_text = build_question_text(question, kind_of_questions)
+        if user_answer == correct_answer:
+            score += 1
+        record_answer(kind_of_questions, user_answer == correct_answer)
+        if position in reports:
+            correct_value = flag_image_url if kind_of_questions == "flag_label" else correct_answer
+            reported_question = ReportedQuestion(
+                user_id=current_user.id, question=question_text, country=question, correct_answer=correct_value, value_from_ai="", approved=False, value_updated=False, timestamp=datetime.utcnow())
+            db.session.add(reported_question)
+            reported_countries.add(question)
+        results.append({"question": question_text, "user_answer": user_answer, "correct_answer": correct_answer})
+    user = User.query.get(current_user.id)
+    user.score += score
+    QuizToken.query.filter(QuizToken.timestamp < datetime.utcnow() - timedelta(seconds=QUIZ_TOKEN_MAX_AGE)).delete()
+    db.session.commit()
+    for country in reported_countries:
+        refresh_country_weight(country)
+    return jsonify(score=score, total=len(results), results=results)
+
 @app.route('/admin/reported_questions')
 @login_required
 def reported_questions():
@@ -574,6 +1084,7 @@ def bypass_question(question_id):
     question = ReportedQuestion.query.get_or_404(question_id)
     question.value_updated = True
     db.session.commit()
+    refresh_country_weight(question.country)
     return redirect(url_for('reported_questions'))
 
 @app.route('/admin/country_updates')
@@ -604,13 +1115,38 @@ def bypass_country_update(country_id):
     db.session.commit()
     return redirect(url_for('country_updates'))
 
+@app.route('/admin/quiz_pool')
+@login_required
+def quiz_pool_stats():
+    if current_user.username != 'admin':
+        return redirect(url_for('home'))
+    return jsonify(quiz_pool.stats())
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+@login_required
+def profiling_settings():
+    if current_user.username != 'admin':
+        return redirect(url_for('home'))
+    if request.method == 'POST':
+        values = request.get_json(silent=True) or request.form
+        try:
+            if 'enabled' in values:
+                profiling.enabled = str(values['enabled']).lower() in ('1', 'true', 'on', 'yes')
+            if 'sample_rate' in values:
+                profiling.sample_rate = min(1.0, max(0.0, float(values['sample_rate'])))
+            if 'slow_threshold_ms' in values:
+                profiling.slow_threshold_ms = float(values['slow_threshold_ms'])
+        except ValueError as e:
+            return jsonify(error=f"Invalid profiling setting: {e}"), 400
+    return jsonify(profiling.as_dict())
+
 @app.route('/admin/reload_country_quiz', methods=['POST'])
 @login_required
 def reload_country_quiz():
     if current_user.username != 'admin':
         return redirect(url_for('home'))
     try:
-        request_or_load_country_data()
+        reload_country_snapshot()
         flash('CountryQuiz data reloaded successfully.')
     except Exception as e:
         flash(f'Error reloading CountryQuiz data: {e}')
@@ -0,0 +1 @@
+"""Benchmarks de desempenho do quiz, executados sem acesso à rede (veja benchmarks/run.py)."""
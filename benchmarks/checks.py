@@ -0,0 +1,205 @@
+"""Verifica, contra os servidores locais, o comportamento das partes do quiz que dependem de serviços externos.
+
+Cada verificação recebe o módulo do aplicativo, importado em um diretório temporário como em benchmarks.run,
+e a URL do servidor de mídia local. O script termina com código 1 se alguma verificação falhar.
+
+Uso:
+    python -m benchmarks.checks
+"""
+from contextlib import redirect_stdout
+import io
+import os
+import sys
+import tempfile
+import time
+import traceback
+import requests
+
+from benchmarks.run import prepare_environment
+from benchmarks.stubs import load_fixture, start_sparql_stub, start_chat_completions_stub, start_media_stub, MEDIA_PNG_SIZE
+from benchmarks.record_fixtures import FIXTURE_PATH
+
+MEDIA_STUB_LATENCY = 2.0  # Atraso das respostas em '/slow/', bem maior que o prazo usado na validação
+
+def expect(condition, message):
+    """Interrompe a verificação com 'message' se a condição for falsa."""
+    if not condition:
+        raise AssertionError(message)
+
+def check_media_cache(app, media_url):
+    """Baixa mídias do servidor local com o MediaCache do aplicativo e as serve pela rota /media."""
+    from PIL import Image
+    cache = app.media_cache
+
+    flag_url = f"{media_url}/png/flag.png"
+    filename = cache.fetch(flag_url, 'flag')
+    expect(filename == cache.key(flag_url) + '.png', f"unexpected file name {filename}")
+    expect(cache.lookup(flag_url) == filename, "fetched flag not found by lookup")
+    with Image.open(os.path.join(cache.cache_dir, filename)) as image:
+        expect(image.width == cache.flag_width, f"flag stored {image.width}px wide instead of {cache.flag_width}px")
+        expect(image.height == round(MEDIA_PNG_SIZE[1] * cache.flag_width / MEDIA_PNG_SIZE[0]), "flag proportions changed")
+
+    anthem_url = f"{media_url}/audio/anthem.ogg"
+    filename = cache.fetch(anthem_url, 'anthem')
+    expect(filename.startswith(cache.key(anthem_url) + '.') and not filename.endswith('.tmp'), f"unexpected file name {filename}")
+    with open(os.path.join(cache.cache_dir, filename), 'rb') as anthem_file:
+        expect(anthem_file.read() == b'stub media', "anthem content changed")
+
+    # Como o Wikimedia, este caminho recusa o User-Agent padrão das bibliotecas HTTP
+    wikimedia_url = f"{media_url}/wikimedia/flag.png"
+    filename = cache.fetch(wikimedia_url, 'flag')
+    expect(filename == cache.key(wikimedia_url) + '.png', f"unexpected file name {filename}")
+
+    svg_url = f"{media_url}/image/flag.svg"
+    try:
+        cache.fetch(svg_url, 'flag')
+        raise AssertionError("SVG flag outside Commons was cached without being resized")
+    except ValueError:
+        pass
+    expect(cache.lookup(svg_url) is None, "SVG flag outside Commons found in the cache")
+
+    missing_url = f"{media_url}/missing/flag.png"
+    try:
+        cache.fetch(missing_url, 'flag')
+        raise AssertionError("404 response was cached")
+    except requests.HTTPError:
+        pass
+    expect(cache.lookup(missing_url) is None, "404 response found in the cache")
+
+    new_url = f"{media_url}/audio/other.ogg"
+    with redirect_stdout(io.StringIO()):
+        counters = cache.prewarm([(flag_url, 'flag'), (svg_url, 'flag'), (missing_url, 'flag'), (new_url, 'anthem'), ('', 'flag')])
+    expect(counters == {'cached': 1, 'downloaded': 1, 'skipped': 1, 'failed': 1}, f"unexpected prewarm counters {counters}")
+
+    client = app.app.test_client()
+    with app.app.test_request_context():
+        path = app.media_url(flag_url)
+        expect(app.media_url(svg_url) == svg_url, "uncached flag not served from its original URL")
+    response = client.get(path)
+    expect(response.status_code == 200, f"GET {path} returned {response.status_code}")
+    expect(f"max-age={app.MEDIA_MAX_AGE}" in response.headers.get('Cache-Control', ''), "missing long-lived Cache-Control")
+    etag = response.headers.get('ETag')
+    expect(etag, "missing ETag")
+    response = client.get(path, headers={'If-None-Match': etag})
+    expect(response.status_code == 304, f"conditional GET returned {response.status_code} instead of 304")
+    expect(client.get('/media/missing.png').status_code == 404, "missing cached file did not return 404")
+
+def check_value_validator(app, media_url):
+    """Valida URLs de cada caminho do servidor de mídia local e valores dos campos verificados em lote."""
+    from validation import ValueValidator
+    timeout = 0.5
+    validator = ValueValidator(timeout=timeout, workers=4)
+    cases = [
+        (('flag_image', f"{media_url}/image/flag.svg"), True),
+        (('anthem_audio', f"{media_url}/audio/anthem.ogg"), True),
+        (('flag_image', f"{media_url}/audio/anthem.ogg"), False),
+        (('flag_image', f"{media_url}/html/page"), False),
+        (('flag_image', f"{media_url}/missing/flag.svg"), False),
+        (('flag_image', f"{media_url}/nohead/flag.png"), True),
+        (('flag_image', f"{media_url}/slow/flag.png"), None),
+        (('flag_image', f"{media_url}/wikimedia/flag.png"), True),
+        (('flag_image', f"{media_url}/redirect/image/flag.svg"), True),
+        (('flag_image', "not a url"), False),
+        (('population', "1234567"), True),
+        (('population', " 42 "), True),
+        (('population', "12 million"), False),
+        (('population', "1,234"), False),
+        (('continent_label', "Europe"), True),
+        (('continent_label', "europe or Asia"), True),
+        (('continent_label', "Atlantis"), False),
+        (('capital_label', "Kingston"), True),
+        (('capital_label', " "), False),
+        ((None, "anything"), None),
+    ]
+    started = time.monotonic()
+    results = validator.validate([item for item, _ in cases])
+    seconds = time.monotonic() - started
+    for (item, expected), (result, reason) in zip(cases, results):
+        expect(result is expected, f"{item} validated as {result} ({reason}), expected {expected}")
+    expect(seconds < MEDIA_STUB_LATENCY, f"validation took {seconds:.2f} s, the {timeout} s deadline was not enforced")
+
+    # Um servidor que recusa o validador não torna o valor inválido
+    anonymous = ValueValidator(timeout=timeout, workers=1, session=requests.Session())
+    result, reason = anonymous.check_url(f"{media_url}/wikimedia/flag.png", ('image/',))
+    expect(result is None, f"403 response validated as {result} ({reason}), expected None")
+
+def check_pipeline(app, media_url):
+    """Executa um pipeline de duas etapas interrompido e depois retomado, e uma execução com falha seguida de outra."""
+    import json
+    from pipeline import Pipeline, Stage
+    calls = []
+    behavior = {'a': None, 'b': None}
+
+    def make_stage(name):
+        def function(progress):
+            calls.append((name, progress.last_id))
+            for last_id in range(progress.last_id + 10, 41, 10):
+                if behavior[name] and last_id == 30:
+                    raise behavior[name]("stage stopped")
+                progress.advance(last_id, 10)
+            return 40
+        return function
+
+    path = os.path.join(tempfile.mkdtemp(prefix='quiz-checks-pipeline-'), 'checkpoint.json')
+    pipeline = Pipeline([Stage('a', make_stage('a')), Stage('b', make_stage('b'), depends_on=['a'])], path)
+
+    # Execução interrompida (como por Ctrl+C) e retomada: a etapa concluída é pulada e a outra continua
+    behavior['b'] = KeyboardInterrupt
+    with redirect_stdout(io.StringIO()):
+        try:
+            pipeline.run()
+            raise AssertionError("KeyboardInterrupt did not stop the run")
+        except KeyboardInterrupt:
+            pass
+    with open(path) as checkpoint_file:
+        stages = json.load(checkpoint_file)['stages']
+    expect(stages['a']['done'] and stages['b'] == {'done': False, 'last_id': 20, 'rows': 20}, f"unexpected checkpoint {stages}")
+    behavior['b'] = None
+    calls.clear()
+    with redirect_stdout(io.StringIO()):
+        results = pipeline.run()
+    expect(results['a']['status'] == 'skipped' and results['b']['status'] == 'done', f"unexpected resumed results {results}")
+    expect(calls == [('b', 20)], f"resumed run made calls {calls}, expected only b from id 20")
+    expect(not os.path.exists(path), "checkpoint left behind after a successful run")
+
+    # Execução que termina com falha: a próxima execução refaz a etapa concluída e continua a que falhou
+    behavior['b'] = RuntimeError
+    with redirect_stdout(io.StringIO()):
+        results = pipeline.run()
+    expect(results['b']['status'] == 'failed', f"unexpected failed run results {results}")
+    behavior['b'] = None
+    calls.clear()
+    with redirect_stdout(io.StringIO()):
+        results = pipeline.run()
+    expect(results['a']['status'] == 'done' and results['b']['status'] == 'done', f"unexpected fresh run results {results}")
+    expect(calls == [('a', 0), ('b', 20)], f"fresh run made calls {calls}, expected a from the start and b from id 20")
+    expect(not os.path.exists(path), "checkpoint left behind after a successful run")
+
+CHECKS = [
+    check_media_cache,
+    check_value_validator,
+    check_pipeline,
+]
+
+def main():
+    _, sparql_url = start_sparql_stub(load_fixture(FIXTURE_PATH))
+    _, media_url = start_media_stub(latency=MEDIA_STUB_LATENCY)
+    _, chat_url = start_chat_completions_stub(media_url=media_url)
+    workdir = tempfile.mkdtemp(prefix='quiz-checks-')
+    prepare_environment(workdir, sparql_url, chat_url)
+    with redirect_stdout(io.StringIO()):
+        import app
+    failures = 0
+    for check in CHECKS:
+        try:
+            check(app, media_url)
+            print(f"ok    {check.__name__}")
+        except Exception:
+            failures += 1
+            print(f"FAIL  {check.__name__}")
+            traceback.print_exc()
+    print(f"{len(CHECKS) - failures} of {len(CHECKS)} checks passed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
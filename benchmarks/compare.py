@@ -0,0 +1,66 @@
+"""Compara dois resultados de benchmarks/run.py e aponta regressões.
+
+Uso:
+    python -m benchmarks.compare benchmarks/results/antigo.json benchmarks/results/novo.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+def collect_metrics(results):
+    """Extrai as métricas comparáveis de um resultado.
+
+    Args:
+        results (dict): Conteúdo de um arquivo de resultados.
+
+    Returns:
+        dict: Valor de cada métrica e se valores maiores são melhores, indexados pelo nome da métrica.
+    """
+    metrics = {}
+    for name, summary in results.get('micro', {}).items():
+        metrics[f"micro {name} p50 (us)"] = (summary['p50'], False)
+    for label, summary in results.get('load', {}).get('routes', {}).items():
+        metrics[f"load {label} p95 (ms)"] = (summary['p95'], False)
+        metrics[f"load {label} p99 (ms)"] = (summary['p99'], False)
+    if 'requests_per_second' in results.get('load', {}):
+        metrics["load requests/s"] = (results['load']['requests_per_second'], True)
+    for name, batch in results.get('batch', {}).items():
+        metrics[f"batch {name} (s)"] = (batch['seconds'], False)
+    return metrics
+
+def compare(baseline, candidate, threshold):
+    """Compara as métricas comuns aos dois resultados.
+
+    Args:
+        baseline (dict): Resultado de referência.
+        candidate (dict): Resultado avaliado.
+        threshold (float): Variação percentual, no sentido ruim, a partir da qual há regressão.
+
+    Returns:
+        list: Tuplas (métrica, valor de referência, valor avaliado, variação percentual, regressão).
+    """
+    baseline_metrics = collect_metrics(baseline)
+    candidate_metrics = collect_metrics(candidate)
+    rows = []
+    for name, (old, higher_is_better) in baseline_metrics.items():
+        if name not in candidate_metrics:
+            continue
+        new = candidate_metrics[name][0]
+        change = (new - old) / old * 100 if old else 0.0
+        worse = -change if higher_is_better else change
+        rows.append((name, old, new, change, worse > threshold))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara dois resultados de benchmark.")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help="Regressão percentual tolerada")
+    args = parser.parse_args()
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+    print(f"{baseline.get('commit')} -> {candidate.get('commit')}")
+    rows = compare(baseline, candidate, args.threshold)
+    for name, old, new, change, regression in rows:
+        print(f"{'REGRESSION ' if regression else '           '}{name:60} {old:12.2f} {new:12.2f} {change:+8.1f}%")
+    sys.exit(1 if any(row[4] for row in rows) else 0)
@@ -0,0 +1,143 @@
+"""Mede a latência das páginas do quiz durante uma rajada de logins.
+
+A latência de GET / de um usuário já autenticado é medida primeiro sem carga e depois com 'storm' threads
+enviando logins sem parar. Com o hashing de senhas no pool limitado, a latência do quiz deve permanecer
+próxima da medida sem carga, enquanto os logins excedentes recebem 503.
+
+Uso:
+    python -m benchmarks.login_storm [--storm 16] [--seconds 10] [--hash-workers 1] [--hash-queue 8] [--output arquivo.json]
+"""
+from contextlib import redirect_stdout
+from datetime import datetime
+import argparse
+import configparser
+import io
+import json
+import multiprocessing
+import os
+import platform
+import tempfile
+import threading
+import time
+import requests
+
+from benchmarks.run import prepare_environment, summarize, current_commit
+from benchmarks.stubs import load_fixture, start_sparql_stub, start_chat_completions_stub
+from benchmarks.record_fixtures import FIXTURE_PATH
+
+def set_hash_settings(workdir, workers, queue):
+    """Acrescenta ao quiz.config do diretório temporário a configuração do pool de hashing."""
+    path = os.path.join(workdir, 'quiz.config')
+    config = configparser.ConfigParser()
+    config.read(path)
+    config['settings']['password_hash_workers'] = str(workers)
+    config['settings']['password_hash_queue'] = str(queue)
+    with open(path, 'w') as config_file:
+        config.write(config_file)
+
+def measure_quiz(base_url, session, seconds):
+    """Mede a latência de GET / de um usuário autenticado durante 'seconds' segundos.
+
+    Args:
+        base_url (str): Endereço do servidor.
+        session (requests.Session): Sessão já autenticada antes da rajada, cujos logins podem ser recusados.
+        seconds (float): Duração da medição.
+
+    Returns:
+        list: Duração de cada requisição, em segundos.
+    """
+    durations = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = session.get(base_url + '/', allow_redirects=False)
+        durations.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET / returned {response.status_code}")
+    return durations
+
+def serve(app, port_queue):
+    """Executa o aplicativo em um servidor WSGI local e informa a porta escolhida."""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+def login_storm(base_url, username, stop, outcomes, lock):
+    """Envia logins seguidos até 'stop' ser sinalizado, contando as respostas por código de status.
+
+    Como um cliente real, espera o tempo indicado em Retry-After quando o login é recusado.
+    """
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = requests.post(base_url + '/login', data={'username': username, 'password': 'benchmark'}, allow_redirects=False)
+        with lock:
+            outcomes.setdefault(response.status_code, []).append(time.perf_counter() - started)
+        if response.status_code == 503:
+            stop.wait(float(response.headers.get('Retry-After', 1)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência do quiz durante uma rajada de logins.")
+    parser.add_argument('--storm', type=int, default=16, help="Threads enviando logins ao mesmo tempo")
+    parser.add_argument('--seconds', type=float, default=10.0, help="Duração de cada medição")
+    parser.add_argument('--hash-workers', type=int, default=1)
+    parser.add_argument('--hash-queue', type=int, default=8)
+    parser.add_argument('--fixture', default=FIXTURE_PATH)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    _, sparql_url = start_sparql_stub(load_fixture(args.fixture))
+    _, chat_url = start_chat_completions_stub()
+    workdir = tempfile.mkdtemp(prefix='quiz-login-storm-')
+    prepare_environment(workdir, sparql_url, chat_url)
+    set_hash_settings(workdir, args.hash_workers, args.hash_queue)
+    with redirect_stdout(io.StringIO()):
+        import app
+    # O servidor roda em outro processo, para que as threads da rajada não disputem o GIL com ele
+    context = multiprocessing.get_context('fork')
+    port_queue = context.Queue()
+    server = context.Process(target=serve, args=(app.app, port_queue), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+    for username in ['reader'] + [f"storm{index}" for index in range(args.storm)]:
+        requests.post(base_url + '/register', data={'username': username, 'password': 'benchmark', 'email': f"{username}@example.com"})
+
+    reader = requests.Session()
+    reader.post(base_url + '/login', data={'username': 'reader', 'password': 'benchmark'}, allow_redirects=False)
+    baseline = measure_quiz(base_url, reader, args.seconds)
+    stop = threading.Event()
+    outcomes = {}
+    lock = threading.Lock()
+    storm_threads = [threading.Thread(target=login_storm, args=(base_url, f"storm{index}", stop, outcomes, lock), daemon=True)
+                     for index in range(args.storm)]
+    for thread in storm_threads:
+        thread.start()
+    during_storm = measure_quiz(base_url, reader, args.seconds)
+    stop.set()
+    for thread in storm_threads:
+        thread.join()
+    server.terminate()
+
+    results = {
+        'commit': current_commit(),
+        'created': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'arguments': vars(args),
+        'quiz_baseline': summarize(baseline, 1e3),
+        'quiz_during_storm': summarize(during_storm, 1e3),
+        'logins': {str(status): summarize(durations, 1e3) for status, durations in sorted(outcomes.items())},
+        'password_hasher': {'method': app.password_hasher.method, 'workers': args.hash_workers, 'max_pending': args.hash_queue},
+    }
+    for label in ('quiz_baseline', 'quiz_during_storm'):
+        summary = results[label]
+        print(f"GET / {label:20} p50 {summary['p50']:8.2f} ms   p95 {summary['p95']:8.2f} ms   p99 {summary['p99']:8.2f} ms   ({summary['count']} requests)")
+    for status, summary in results['logins'].items():
+        print(f"POST /login -> {status:13} p50 {summary['p50']:8.2f} ms   p95 {summary['p95']:8.2f} ms   ({summary['count']} requests)")
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Grava a resposta SPARQL usada pelos benchmarks.
+
+Uso:
+    python -m benchmarks.record_fixtures --endpoint https://query.wikidata.org/sparql
+    python -m benchmarks.record_fixtures --from-db extra/quiz-gpt-4o-2024-05-21.db
+"""
+from itertools import product
+import argparse
+import configparser
+import gzip
+import json
+import os
+import sqlite3
+import requests
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'wikidata_sparql.json.gz')
+
+def record_from_endpoint(endpoint, config_path='quiz.config'):
+    """Executa a consulta do Wikidata configurada em quiz.config e retorna as linhas da resposta.
+
+    Args:
+        endpoint (str): URL do endpoint SPARQL.
+        config_path (str): Caminho do arquivo de configuração.
+
+    Returns:
+        list: Linhas ('bindings') da resposta SPARQL.
+    """
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    query = config.get('settings', 'wikidata_sparql_query')
+    response = requests.get(endpoint, params={"query": query, "format": "json"}, timeout=300)
+    response.raise_for_status()
+    return response.json()["results"]["bindings"]
+
+def split_unified_value(value):
+    """Desfaz a junção feita por unify_country_data ('A, B or C') em uma lista de valores."""
+    if " or " not in value:
+        return [value]
+    head, last = value.rsplit(" or ", 1)
+    return head.split(", ") + [last]
+
+def record_from_db(db_path):
+    """Reconstrói linhas SPARQL a partir dos dados de países gravados em um banco do quiz.
+
+    Os dados em CountryFromSemanticDatabase são as linhas do Wikidata já unificadas por país; propriedades
+    com vários valores voltam a ser expandidas em uma linha por combinação, como na resposta original.
+
+    Args:
+        db_path (str): Caminho do banco SQLite.
+
+    Returns:
+        list: Linhas ('bindings') no formato da resposta SPARQL.
+    """
+    connection = sqlite3.connect(db_path)
+    bindings = []
+    for (data,) in connection.execute("SELECT data FROM country_from_semantic_database ORDER BY id"):
+        country = json.loads(data)
+        keys = list(country)
+        alternatives = [split_unified_value(country[key].get('value', '')) for key in keys]
+        for values in product(*alternatives):
+            row = {}
+            for key, value in zip(keys, values):
+                row[key] = dict(country[key], value=value)
+            bindings.append(row)
+    connection.close()
+    return bindings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grava a fixture SPARQL dos benchmarks.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--endpoint')
+    source.add_argument('--from-db')
+    parser.add_argument('--output', default=FIXTURE_PATH)
+    args = parser.parse_args()
+    bindings = record_from_endpoint(args.endpoint) if args.endpoint else record_from_db(args.from_db)
+    with gzip.open(args.output, 'wt', encoding='utf-8') as fixture_file:
+        json.dump({'head': {'vars': []}, 'results': {'bindings': bindings}}, fixture_file)
+    print(f"Recorded {len(bindings)} rows to {args.output}.")
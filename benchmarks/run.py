@@ -0,0 +1,289 @@
+"""Executa os micro-benchmarks e o teste de carga do quiz sem acesso à rede.
+
+O aplicativo é importado em um diretório temporário, com banco de dados novo, endpoint SPARQL local
+servindo a fixture gravada e uma API de chat completions local no lugar da OpenAI.
+
+Uso:
+    python -m benchmarks.run [--iterations 50] [--concurrency 1] [--transport testclient|wsgi] [--output arquivo.json]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+import argparse
+import configparser
+import copy
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+
+from benchmarks.stubs import load_fixture, start_sparql_stub, start_chat_completions_stub, start_media_stub
+from benchmarks.record_fixtures import FIXTURE_PATH
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPOSITORY_DIR, 'benchmarks', 'results')
+
+def percentile(sorted_values, fraction):
+    """Calcula um percentil pelo método do posto mais próximo.
+
+    Args:
+        sorted_values (list): Valores em ordem crescente.
+        fraction (float): Percentil desejado, entre 0 e 1.
+
+    Returns:
+        float: Valor do percentil.
+    """
+    if not sorted_values:
+        return 0.0
+    position = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[position]
+
+def summarize(durations, scale):
+    """Resume uma lista de durações em segundos.
+
+    Args:
+        durations (list): Durações medidas, em segundos.
+        scale (float): Fator aplicado aos resultados (1e3 para milissegundos, 1e6 para microssegundos).
+
+    Returns:
+        dict: Contagem, média, mínimo e percentis 50, 95 e 99.
+    """
+    values = sorted(duration * scale for duration in durations)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'min': values[0] if values else 0.0,
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+    }
+
+def prepare_environment(workdir, sparql_url, chat_url):
+    """Cria o quiz.config do diretório temporário, apontando banco, SPARQL e OpenAI para os recursos locais.
+
+    As consultas SPARQL são copiadas do quiz.config do repositório.
+    """
+    source = configparser.ConfigParser()
+    source.read(os.path.join(REPOSITORY_DIR, 'quiz.config'))
+    config = configparser.ConfigParser()
+    config['settings'] = {
+        'database': 'WIKIDATA',
+        'wikidata_sparql_query': source.get('settings', 'wikidata_sparql_query'),
+        'dbpedia_sparql_query': source.get('settings', 'dbpedia_sparql_query'),
+        'wikidata_sparql_endpoint': sparql_url,
+        'dbpedia_sparql_endpoint': sparql_url,
+        'openai_api_key': 'stub',
+        'openai_base_url': chat_url,
+        'database_uri': 'sqlite:///' + os.path.join(workdir, 'quiz.db'),
+        'media_cache_dir': os.path.join(workdir, 'media_cache'),
+        'history_archive_dir': os.path.join(workdir, 'history_archive'),
+    }
+    with open(os.path.join(workdir, 'quiz.config'), 'w') as config_file:
+        config.write(config_file)
+    os.chdir(workdir)
+    if REPOSITORY_DIR not in sys.path:
+        sys.path.insert(0, REPOSITORY_DIR)
+
+def time_calls(function, arguments):
+    """Mede o tempo de cada chamada de uma função.
+
+    Args:
+        function (callable): Função medida.
+        arguments (list): Tuplas de argumentos, uma por chamada, preparadas antes da medição.
+
+    Returns:
+        list: Duração de cada chamada, em segundos.
+    """
+    durations = []
+    for args in arguments:
+        started = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def run_micro_benchmarks(app, raw_bindings, repeat):
+    """Executa os micro-benchmarks das funções do caminho do quiz e da carga de dados.
+
+    Returns:
+        dict: Resumo, em microssegundos, de cada função medida.
+    """
+    unified = app.unify_country_data(copy.deepcopy(raw_bindings))
+    questions = [entry for quiz in (app.generate_quiz() for _ in range(repeat)) for entry in quiz]
+    blanked = copy.deepcopy(unified)
+    for entry in blanked[::3]:
+        entry['capital_label']['value'] = ''
+    kind_weights = [1.0 + index for index in range(len(app.quiz_kinds()))]
+    recent = app.RecentBitset()
+    for position in range(0, len(app.all_data), 4):
+        recent.add(position)
+    results = {}
+    with redirect_stdout(io.StringIO()):
+        results['generate_quiz'] = time_calls(app.generate_quiz, [()] * repeat)
+        results['generate_quiz_adaptive'] = time_calls(app.generate_quiz, [(kind_weights, recent)] * repeat)
+        results['choose_options'] = time_calls(app.choose_options, [(question[0], question[1], kind) for question, kind, _ in questions[:repeat]])
+        results['unify_country_data'] = time_calls(app.unify_country_data, [(copy.deepcopy(raw_bindings),) for _ in range(max(1, repeat // 10))])
+        results['join_data'] = time_calls(app.join_data, [(copy.deepcopy(blanked), copy.deepcopy(unified)) for _ in range(max(1, repeat // 10))])
+        results['register_country_blanks'] = time_calls(app.register_country_blanks, [(copy.deepcopy(unified),) for _ in range(max(1, repeat // 50))])
+    return {name: summarize(durations, 1e6) for name, durations in results.items()}
+
+def run_batch_benchmarks(app, data_update):
+    """Mede as etapas do data_update.py contra os servidores locais.
+
+    Returns:
+        dict: Duração, em segundos, e linhas processadas de cada etapa.
+    """
+    results = {}
+    session = data_update.Session()
+    blanks = session.query(app.CountryBlanksFromSemanticDatabase).count()
+    session.close()
+    with redirect_stdout(io.StringIO()):
+        for name, function, rows in [
+            ('update_country_blanks_from_semanticdatabase_with_ai', data_update.update_country_blanks_from_semanticdatabase_with_ai, blanks),
+            ('validate_country_blanks', data_update.validate_country_blanks, blanks),
+            ('full_sync', lambda: data_update.update_new_country_data_from_semanticdatabase_in_countryQuiz(incremental=False), None),
+            ('incremental_sync', lambda: data_update.update_new_country_data_from_semanticdatabase_in_countryQuiz(incremental=True), None),
+        ]:
+            started = time.perf_counter()
+            function()
+            results[name] = {'seconds': time.perf_counter() - started, 'rows': rows}
+    return results
+
+class TestClientTransport:
+    """Envia as requisições pelo cliente de testes do Flask, no mesmo processo."""
+
+    def __init__(self, app):
+        self.client = app.app.test_client()
+
+    def request(self, method, path, data=None):
+        return self.client.open(path, method=method, data=data).status_code
+
+class WsgiTransport:
+    """Envia as requisições por HTTP para um servidor WSGI local."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def request(self, method, path, data=None):
+        return self.session.request(method, self.base_url + path, data=data, allow_redirects=False).status_code
+
+def run_quiz_cycles(transport, username, iterations, latencies, lock):
+    """Executa ciclos completos de quiz (login, seis perguntas e resultado), registrando a latência por rota."""
+    def timed(label, method, path, data=None):
+        started = time.perf_counter()
+        status = transport.request(method, path, data)
+        duration = time.perf_counter() - started
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} returned {status}")
+        with lock:
+            latencies.setdefault(label, []).append(duration)
+
+    for _ in range(iterations):
+        timed('GET /login', 'GET', '/login')
+        timed('POST /login', 'POST', '/login', {'username': username, 'password': 'benchmark'})
+        for _ in range(6):
+            timed('GET /', 'GET', '/')
+            timed('POST /', 'POST', '/', {'answer': random.choice(['a', 'b'])})
+        timed('GET /result', 'GET', '/result')
+        transport.request('GET', '/logout')
+
+def run_load(app, iterations, concurrency, transport_name):
+    """Executa o teste de carga com 'concurrency' usuários simultâneos.
+
+    Returns:
+        dict: Latências por rota (ms), total de requisições, duração e requisições por segundo.
+    """
+    server = None
+    if transport_name == 'wsgi':
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        make_transport = lambda: WsgiTransport(f"http://127.0.0.1:{server.server_port}")
+    else:
+        make_transport = lambda: TestClientTransport(app)
+    usernames = [f"benchmark{index}" for index in range(concurrency)]
+    for username in usernames:
+        make_transport().request('POST', '/register', {'username': username, 'password': 'benchmark', 'email': f"{username}@example.com"})
+    latencies = {}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_quiz_cycles, make_transport(), username, iterations, latencies, lock) for username in usernames]
+        for future in futures:
+            future.result()
+    seconds = time.perf_counter() - started
+    if server is not None:
+        server.shutdown()
+    total = sum(len(durations) for durations in latencies.values())
+    return {
+        'transport': transport_name,
+        'concurrency': concurrency,
+        'routes': {label: summarize(durations, 1e3) for label, durations in latencies.items()},
+        'requests': total,
+        'seconds': seconds,
+        'requests_per_second': total / seconds if seconds else 0.0,
+    }
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPOSITORY_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do quiz com fixtures locais.")
+    parser.add_argument('--iterations', type=int, default=20, help="Ciclos de quiz por usuário no teste de carga")
+    parser.add_argument('--concurrency', type=int, default=1, help="Usuários simultâneos no teste de carga")
+    parser.add_argument('--transport', choices=['testclient', 'wsgi'], default='testclient')
+    parser.add_argument('--repeat', type=int, default=200, help="Chamadas por micro-benchmark")
+    parser.add_argument('--fixture', default=FIXTURE_PATH)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    commit = current_commit()
+    output = os.path.abspath(args.output or os.path.join(RESULTS_DIR, f"{commit}.json"))
+    raw_bindings = load_fixture(args.fixture)
+    _, sparql_url = start_sparql_stub(raw_bindings)
+    _, media_url = start_media_stub()
+    _, chat_url = start_chat_completions_stub(media_url=media_url)
+    workdir = tempfile.mkdtemp(prefix='quiz-benchmark-')
+    prepare_environment(workdir, sparql_url, chat_url)
+
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        import app
+        import data_update
+    import_seconds = time.perf_counter() - started
+
+    results = {
+        'commit': commit,
+        'created': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'arguments': vars(args),
+        'import_seconds': import_seconds,
+        'micro': run_micro_benchmarks(app, raw_bindings, args.repeat),
+        'load': run_load(app, args.iterations, args.concurrency, args.transport),
+        'batch': run_batch_benchmarks(app, data_update),
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+
+    for name, summary in results['micro'].items():
+        print(f"{name:28} p50 {summary['p50']:10.1f} us   p95 {summary['p95']:10.1f} us")
+    for label, summary in results['load']['routes'].items():
+        print(f"{label:28} p50 {summary['p50']:8.2f} ms   p95 {summary['p95']:8.2f} ms   p99 {summary['p99']:8.2f} ms")
+    print(f"{results['load']['requests']} requests in {results['load']['seconds']:.2f} s ({results['load']['requests_per_second']:.1f} req/s)")
+    for name, batch in results['batch'].items():
+        print(f"{name:28} {batch['seconds']:.2f} s")
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
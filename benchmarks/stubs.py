@@ -0,0 +1,211 @@
+"""Servidores HTTP locais que substituem o endpoint SPARQL, a API de chat completions da OpenAI e os arquivos de mídia nos benchmarks."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import gzip
+import json
+import struct
+import threading
+import time
+import zlib
+
+INCREMENTAL_ROWS = 3  # Linhas devolvidas para consultas filtradas por schema:dateModified
+
+def load_fixture(path):
+    """Lê um arquivo de fixture SPARQL (JSON, opcionalmente compactado com gzip).
+
+    Args:
+        path (str): Caminho do arquivo.
+
+    Returns:
+        list: Lista de 'bindings' no formato de resposta SPARQL JSON.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as fixture_file:
+        return json.load(fixture_file)['results']['bindings']
+
+def start_server(handler_class):
+    """Inicia um servidor HTTP em uma porta livre de 127.0.0.1, em uma thread em segundo plano.
+
+    Args:
+        handler_class: Classe que trata as requisições.
+
+    Returns:
+        tuple: Servidor iniciado e sua URL base.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=handler_class.__name__, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """Base dos servidores locais: não registra as requisições e responde JSON."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_sparql_stub(bindings, latency=0.0):
+    """Inicia um endpoint SPARQL que responde qualquer consulta com as linhas gravadas.
+
+    Consultas filtradas por schema:dateModified (sincronização incremental) recebem apenas as primeiras linhas.
+
+    Args:
+        bindings (list): Linhas da resposta SPARQL gravada.
+        latency (float): Atraso, em segundos, adicionado a cada resposta.
+
+    Returns:
+        tuple: Servidor iniciado e a URL do endpoint.
+    """
+    class SparqlHandler(QuietHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query).get('query', [''])[0]
+            rows = bindings[:INCREMENTAL_ROWS] if 'schema:dateModified' in query else bindings
+            time.sleep(latency)
+            self.send_json({'head': {'vars': []}, 'results': {'bindings': rows}})
+
+    server, base_url = start_server(SparqlHandler)
+    return server, base_url + "/sparql"
+
+CANNED_ANSWERS = {
+    "population": "1234567",
+    "flag": "https://upload.wikimedia.org/wikipedia/commons/0/0a/Flag_of_Jamaica.svg",
+    "anthem": "https://upload.wikimedia.org/wikipedia/commons/0/0c/Jamaica_national_anthem.ogg",
+    "continent": "Europe",
+}
+
+def canned_answer(prompt, media_url=None):
+    """Escolhe a resposta fixa de um prompt pela primeira palavra-chave encontrada.
+
+    Args:
+        prompt (str): Prompt recebido.
+        media_url (str, optional): URL base de um servidor de mídia local, usada no lugar do Wikimedia Commons nas URLs de bandeiras e hinos.
+    """
+    for keyword, answer in CANNED_ANSWERS.items():
+        if keyword in prompt.lower():
+            if media_url and keyword in ("flag", "anthem"):
+                return f"{media_url}/{'image' if keyword == 'flag' else 'audio'}/{answer.rsplit('/', 1)[-1]}"
+            return answer
+    return "Stub answer"
+
+def start_chat_completions_stub(latency=0.0, media_url=None):
+    """Inicia uma API compatível com /v1/chat/completions que devolve respostas fixas por palavra-chave.
+
+    Args:
+        latency (float): Atraso, em segundos, adicionado a cada resposta, simulando o tempo do modelo.
+        media_url (str, optional): URL base de um servidor de mídia local para as respostas com URLs.
+
+    Returns:
+        tuple: Servidor iniciado e a URL base a ser usada como 'openai_base_url'.
+    """
+    class ChatCompletionsHandler(QuietHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            request_body = json.loads(self.rfile.read(length) or b'{}')
+            prompt = " ".join(message.get('content', '') for message in request_body.get('messages', []))
+            answer = canned_answer(prompt, media_url)
+            time.sleep(latency)
+            prompt_tokens = len(prompt.split())
+            completion_tokens = len(answer.split())
+            self.send_json({
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request_body.get('model', 'stub'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+            })
+
+    server, base_url = start_server(ChatCompletionsHandler)
+    return server, base_url + "/v1/"
+
+def png_image(width, height):
+    """Gera uma imagem PNG em escala de cinza, sem depender do Pillow.
+
+    Args:
+        width (int): Largura, em pixels.
+        height (int): Altura, em pixels.
+
+    Returns:
+        bytes: Conteúdo do arquivo PNG.
+    """
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    rows = b''.join(b'\x00' + bytes(column % 256 for column in range(width)) for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+MEDIA_PNG_SIZE = (600, 400)  # Tamanho da imagem servida em '/png/', maior que a largura das bandeiras em cache
+
+# Content-Type devolvido pelo servidor de mídia local, pelo primeiro segmento do caminho
+MEDIA_CONTENT_TYPES = {
+    'image': 'image/svg+xml',
+    'png': 'image/png',
+    'audio': 'application/ogg',
+    'html': 'text/html; charset=utf-8',
+}
+
+def start_media_stub(latency=0.0):
+    """Inicia um servidor de mídia que responde conforme o primeiro segmento do caminho.
+
+    '/image/...', '/audio/...' e '/html/...' respondem 200 com o tipo de conteúdo correspondente; '/png/...' responde
+    com uma imagem (todas as imagens são PNGs de MEDIA_PNG_SIZE pixels); '/nohead/...' recusa HEAD com 405 e responde GET com uma imagem;
+    '/slow/...' demora 'latency' segundos antes de responder com uma imagem; '/wikimedia/...' responde com uma imagem,
+    mas, como o Wikimedia, recusa com 403 o User-Agent padrão das bibliotecas HTTP; '/redirect/<caminho>' redireciona
+    para '/<caminho>'; qualquer outro caminho responde 404.
+
+    Args:
+        latency (float): Atraso, em segundos, das respostas em '/slow/'.
+
+    Returns:
+        tuple: Servidor iniciado e sua URL base.
+    """
+    png = png_image(*MEDIA_PNG_SIZE)
+
+    class MediaHandler(QuietHandler):
+        def send_empty(self, status, headers=()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def respond(self, include_body):
+            path = urlparse(self.path).path.strip('/')
+            kind = path.split('/')[0]
+            if kind == 'redirect':
+                self.send_empty(302, [('Location', '/' + path.partition('/')[2])])
+                return
+            if kind == 'wikimedia' and self.headers.get('User-Agent', '').startswith('python-requests'):
+                self.send_empty(403)
+                return
+            if kind == 'nohead' and not include_body:
+                self.send_empty(405)
+                return
+            if kind == 'slow':
+                time.sleep(latency)
+            content_type = MEDIA_CONTENT_TYPES.get(kind, 'image/png' if kind in ('nohead', 'slow', 'wikimedia') else None)
+            if content_type is None:
+                self.send_empty(404)
+                return
+            body = png if content_type == 'image/png' else b'stub media'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if include_body:
+                self.wfile.write(body)
+
+        def do_HEAD(self):
+            self.respond(include_body=False)
+
+        def do_GET(self):
+            self.respond(include_body=True)
+
+    return start_server(MediaHandler)
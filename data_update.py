@@ -1,8 +1,15 @@
-from app import ReportedQuestion, CountryBlanksFromSemanticDatabase, CountryQuiz, CountryQuizUpdatesHistory, CountryFromSemanticDatabase, get_country_data
+from app import ReportedQuestion, CountryBlanksFromSemanticDatabase, CountryQuiz, CountryQuizUpdatesHistory, CountryFromSemanticDatabase, SyncState, get_country_data, filter_query_by_modification, database, media_cache, profiling, WIKIDATA_SPARQL_QUERY, sparql_fetch_latency, sparql_payload_bytes
 from sqlalchemy import create_engine, and_
 from sqlalchemy.orm import sessionmaker, scoped_session
-from datetime import datetime
+from datetime import datetime, timedelta
+from metrics import batch_registry
+from profiler import profile_block
+from pipeline import Pipeline, Stage
+from validation import ValueValidator
+import argparse
+import sys
 import openai
+import time
 import json
 import configparser
 import os
@@ -11,15 +18,72 @@ config = configparser.ConfigParser()
 config.read('quiz.config')
 
 OPENAI_API_KEY = config.get('settings', 'openai_api_key', fallback=os.getenv('OPENAI_API_KEY'))
+OPENAI_BASE_URL = config.get('settings', 'openai_base_url', fallback=os.getenv('OPENAI_BASE_URL'))
+METRICS_TEXTFILE = config.get('settings', 'metrics_textfile', fallback=os.getenv('METRICS_TEXTFILE', 'data_update.prom'))
+PROFILE_STAGES = config.get('settings', 'profile_stages', fallback=os.getenv('PROFILE_STAGES', 'false')).lower() in ('1', 'true', 'yes')
+FULL_SYNC_INTERVAL_DAYS = int(config.get('settings', 'full_sync_interval_days', fallback=os.getenv('FULL_SYNC_INTERVAL_DAYS', '7')))
+PIPELINE_CHECKPOINT = config.get('settings', 'pipeline_checkpoint', fallback=os.getenv('PIPELINE_CHECKPOINT', 'data_update.checkpoint.json'))
+PIPELINE_BATCH_SIZE = int(config.get('settings', 'pipeline_batch_size', fallback=os.getenv('PIPELINE_BATCH_SIZE', '20')))
+PIPELINE_WORKERS = int(config.get('settings', 'pipeline_workers', fallback=os.getenv('PIPELINE_WORKERS', '4')))
+VALIDATION_TIMEOUT = float(config.get('settings', 'validation_timeout', fallback=os.getenv('VALIDATION_TIMEOUT', '5')))
+VALIDATION_WORKERS = int(config.get('settings', 'validation_workers', fallback=os.getenv('VALIDATION_WORKERS', '8')))
 
-DATABASE_URI = 'sqlite:///quiz.db'
+DATABASE_URI = config.get('settings', 'database_uri', fallback=os.getenv('DATABASE_URI', 'sqlite:///quiz.db'))
 
 openai.api_key = OPENAI_API_KEY
+if OPENAI_BASE_URL:
+    openai.base_url = OPENAI_BASE_URL
 
 engine = create_engine(DATABASE_URI)
 session_factory = sessionmaker(bind=engine)
 Session = scoped_session(session_factory)
 
+openai_request_latency = batch_registry.histogram('quiz_openai_request_duration_seconds', 'Latency of OpenAI chat completion calls.')
+openai_tokens = batch_registry.counter('quiz_openai_tokens_total', 'Tokens consumed by OpenAI chat completion calls.')
+openai_errors = batch_registry.counter('quiz_openai_errors_total', 'Failed OpenAI chat completion calls.')
+validated_values = batch_registry.counter('quiz_ai_values_validated_total', 'AI-proposed values checked before admin review, by field and result.')
+# A etapa de sincronização consulta as bases SPARQL pelas funções do app.py
+batch_registry.register(sparql_fetch_latency)
+batch_registry.register(sparql_payload_bytes)
+
+value_validator = ValueValidator(VALIDATION_TIMEOUT, VALIDATION_WORKERS)
+
+# Margem de sobreposição das sincronizações incrementais, para cobrir o atraso de indexação do serviço de consultas do Wikidata
+SYNC_OVERLAP = timedelta(hours=1)
+
+def iterate_batches(query, model, progress=None, batch_size=PIPELINE_BATCH_SIZE):
+    """Percorre as linhas de uma consulta em lotes ordenados por id.
+
+    O lote só é registrado no progresso depois que o chamador o processa, de forma que uma execução
+    interrompida recomeça no primeiro lote não concluído.
+
+    Args:
+        query: Consulta SQLAlchemy das linhas pendentes.
+        model: Modelo consultado, cujo campo id ordena os lotes.
+        progress (StageProgress, optional): Progresso da etapa no pipeline; sem ele, a consulta é percorrida do início.
+        batch_size (int): Número de linhas por lote.
+
+    Yields:
+        list: Linhas do lote.
+    """
+    last_id = progress.last_id if progress else 0
+    while True:
+        batch = query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+        if progress:
+            progress.advance(last_id, len(batch))
+
+def count_rows(model, *criteria):
+    """Conta as linhas de um modelo que atendem aos critérios informados."""
+    session = Session()
+    try:
+        return session.query(model).filter(*criteria).count()
+    finally:
+        session.close()
+
 def determine_prompt(question_text):
     """Determina o prompt adequado para uma pergunta com base em palavras-chave específicas.
 
@@ -44,161 +108,310 @@ def determine_prompt(question_text):
             return prompt
     return "DEFAULT_PROMPT"
 
-def update_reported_questions_with_ai():
+def ask_openai(prompt, stage):
+    """Envia um prompt à API OpenAI, registrando latência, tokens consumidos e erros.
+
+    Args:
+        prompt (str): Prompt enviado ao modelo.
+        stage (str): Nome da etapa que fez a chamada, usado como rótulo das métricas.
+
+    Returns:
+        str: Resposta do modelo, sem espaços nas extremidades.
+    """
+    started = time.perf_counter()
+    try:
+        response = openai.chat.completions.create(
+            model="gpt-4o", #model="gpt-4-turbo-preview",#
+            messages= [{'role': 'user', 'content': prompt}
+            ],
+            temperature= 0
+        )
+    except Exception as e:
+        openai_errors.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        openai_request_latency.observe(time.perf_counter() - started, stage=stage)
+    if response.usage:
+        openai_tokens.inc(response.usage.prompt_tokens, stage=stage, type="prompt")
+        openai_tokens.inc(response.usage.completion_tokens, stage=stage, type="completion")
+    return response.choices[0].message.content.strip()
+
+def update_reported_questions_with_ai(progress=None):
     """Atualiza perguntas reportadas usando respostas geradas pela API OpenAI.
 
     Usa prompts determinados para cada pergunta e salva as respostas no banco de dados.
+
+    Args:
+        progress (StageProgress, optional): Progresso da etapa no pipeline.
+
+    Returns:
+        int: Número de perguntas processadas.
     """
     session = Session()
-    reported_questions = session.query(ReportedQuestion).filter(ReportedQuestion.value_from_ai.is_("")).all()
-    for question in reported_questions:
-        try:
-            prompt = determine_prompt(question.question)
-            if prompt == "DEFAULT_PROMPT":
-                continue
-            else:
-                prompt = prompt.replace("**", question.country)
-            print(prompt)
-            response = openai.chat.completions.create(
-                model="gpt-4o", #model="gpt-4-turbo-preview",#
-                messages= [{'role': 'user', 'content': prompt}
-                ],
-                temperature= 0
-            )
-            print(response.choices[0].message.content.strip())
-            question.value_from_ai = response.choices[0].message.content.strip()
-            session.commit()
-        except Exception as e:
-            print(f"Error updating question {question.id}: {e}")
+    pending_questions = session.query(ReportedQuestion).filter(ReportedQuestion.value_from_ai.is_(""))
+    rows = 0
+    for reported_questions in iterate_batches(pending_questions, ReportedQuestion, progress):
+        for question in reported_questions:
+            try:
+                prompt = determine_prompt(question.question)
+                if prompt == "DEFAULT_PROMPT":
+                    continue
+                else:
+                    prompt = prompt.replace("**", question.country)
+                print(prompt)
+                answer = ask_openai(prompt, "reported_questions")
+                print(answer)
+                question.value_from_ai = answer
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                print(f"Error updating question {question.id}: {e}")
+        rows += len(reported_questions)
     session.close()
+    return rows
 
-def update_country_blanks_from_semanticdatabase_with_ai():
+def update_country_blanks_from_semanticdatabase_with_ai(progress=None):
     """Atualiza entradas de país com dados faltantes usando respostas da API OpenAI.
 
     Identifica lacunas nos dados, usa a IA para gerar preenchimentos e atualiza o banco de dados.
+
+    Args:
+        progress (StageProgress, optional): Progresso da etapa no pipeline.
+
+    Returns:
+        int: Número de lacunas processadas.
     """
     session = Session()
-    country_data = session.query(CountryBlanksFromSemanticDatabase).filter(CountryBlanksFromSemanticDatabase.value_from_ai.is_("")).all()
-    for question in country_data:
-        try:
-            key = question.key
-            if question.key == "highest_point_label":
-                key = "highest point"
-            prompt = determine_prompt(key)
-            if prompt == "DEFAULT_PROMPT":
-                continue
-            else:
-                prompt = prompt.replace("**", question.country_label)
-            print(prompt)
-            response = openai.chat.completions.create(
-                model="gpt-4o", #model="gpt-4-turbo-preview",#
-                messages= [{'role': 'user', 'content': prompt}
-                ],
-                temperature= 0
-            )
-            print(response.choices[0].message.content.strip())
-            question.value_from_ai = response.choices[0].message.content.strip()
-            session.commit()
-
-            # Teste -- apenas uma consulta na OpenAI API
-            #break
-        
-        except Exception as e:
-            print(f"Erro ao atualizar a questão {question.id}: {e}")
+    pending_blanks = session.query(CountryBlanksFromSemanticDatabase).filter(CountryBlanksFromSemanticDatabase.value_from_ai.is_(""))
+    rows = 0
+    for country_data in iterate_batches(pending_blanks, CountryBlanksFromSemanticDatabase, progress):
+        for question in country_data:
+            try:
+                key = question.key
+                if question.key == "highest_point_label":
+                    key = "highest point"
+                prompt = determine_prompt(key)
+                if prompt == "DEFAULT_PROMPT":
+                    continue
+                else:
+                    prompt = prompt.replace("**", question.country_label)
+                print(prompt)
+                answer = ask_openai(prompt, "country_blanks")
+                print(answer)
+                question.value_from_ai = answer
+                session.commit()
+
+                # Teste -- apenas uma consulta na OpenAI API
+                #break
+
+            except Exception as e:
+                session.rollback()
+                print(f"Erro ao atualizar a questão {question.id}: {e}")
+        rows += len(country_data)
     session.close()
+    return rows
+
+def question_field(question_text):
+    """Identifica o campo dos dados do país ao qual uma pergunta se refere.
+
+    Args:
+        question_text (str): Texto da pergunta.
 
-def update_countryQuiz_from_approved_questions():
+    Returns:
+        str: Chave do campo nos dados do país, ou None se a pergunta não for reconhecida.
+    """
+    if "population" in question_text:
+        return "population"
+    elif "capital" in question_text:
+        return "capital_label"
+    elif "currency" in question_text:
+        return "currency_label"
+    elif "flag" in question_text:
+        return "flag_image"
+    elif "continent" in question_text:
+        return "continent_label"
+    elif "highest point" in question_text:
+        return "highest_point_label"
+    elif "language" in question_text:
+        return "official_language_label"
+    return None
+
+def validate_ai_values(model, field_of, progress=None):
+    """Valida os valores propostos pela IA que aguardam revisão, rejeitando automaticamente os inválidos.
+
+    Valores inválidos são marcados como atualizados, como no 'bypass' do admin, e saem da fila de revisão.
+    Valores que não puderam ser verificados, como URLs que não responderam a tempo, continuam na fila.
+
+    Args:
+        model: ReportedQuestion ou CountryBlanksFromSemanticDatabase.
+        field_of (callable): Função que retorna a chave do campo do país a que uma linha se refere.
+        progress (StageProgress, optional): Progresso da etapa no pipeline.
+
+    Returns:
+        int: Número de valores verificados.
+    """
+    session = Session()
+    pending_values = session.query(model).filter(model.value_from_ai != "", model.approved == False, model.value_updated == False)
+    rows = 0
+    for batch in iterate_batches(pending_values, model, progress):
+        fields = [field_of(row) for row in batch]
+        results = value_validator.validate([(field, row.value_from_ai) for field, row in zip(fields, batch)])
+        for row, field, (valid, reason) in zip(batch, fields, results):
+            validated_values.inc(table=model.__tablename__, field=field or "unknown", result={True: "valid", False: "rejected", None: "unverified"}[valid])
+            if valid is False:
+                row.value_updated = True
+                print(f"Rejected {model.__tablename__} {row.id} ({field}: {row.value_from_ai!r}): {reason}")
+        session.commit()
+        rows += len(batch)
+    session.close()
+    return rows
+
+def validate_reported_questions(progress=None):
+    """Valida as respostas da IA para perguntas reportadas."""
+    return validate_ai_values(ReportedQuestion, lambda question: question_field(question.question), progress)
+
+def validate_country_blanks(progress=None):
+    """Valida os preenchimentos propostos pela IA para lacunas dos dados de países."""
+    return validate_ai_values(CountryBlanksFromSemanticDatabase, lambda blank: blank.key, progress)
+
+def update_countryQuiz_from_approved_questions(progress=None):
     """Atualiza o quiz com respostas aprovadas de perguntas reportadas.
 
     Verifica questões aprovadas que ainda não foram atualizadas, atualiza os dados do quiz e registra o histórico.
+
+    Args:
+        progress (StageProgress, optional): Progresso da etapa no pipeline.
+
+    Returns:
+        int: Número de perguntas aprovadas processadas.
     """
     session = Session()
     approved_questions = session.query(ReportedQuestion)\
-        .filter(ReportedQuestion.approved == True, ReportedQuestion.value_updated == False).all()
-    for question in approved_questions:
-        json_field = None
-        requires_value_key = True  # Flag para indicar se o campo requer "value: " antes do valor
-        if "population" in question.question:
-            json_field = "population"
-        elif "capital" in question.question:
-            json_field = "capital_label"
-        elif "currency" in question.question:
-            json_field = "currency_label"
-        elif "flag" in question.question:
-            json_field = "flag_image"
-        elif "continent" in question.question:
-            json_field = "continent_label"
-        elif "highest point" in question.question:
-            json_field = "highest_point_label"
-        elif "language" in question.question:
-            json_field = "official_language_label"
-        if json_field:
-            country = session.query(CountryQuiz).filter(CountryQuiz.country_label == question.country).first()
+        .filter(ReportedQuestion.approved == True, ReportedQuestion.value_updated == False)
+    rows = 0
+    for batch in iterate_batches(approved_questions, ReportedQuestion, progress):
+        for question in batch:
+            json_field = question_field(question.question)
+            requires_value_key = True  # Flag para indicar se o campo requer "value: " antes do valor
+            if json_field:
+                country = session.query(CountryQuiz).filter(CountryQuiz.country_label == question.country).first()
+                if country:
+                    country_data = json.loads(country.data) if country.data else {}
+                    country_label = question.country
+                    old_data = question.correct_answer
+                    if requires_value_key:
+                        if json_field not in country_data or not isinstance(country_data[json_field], dict):
+                            country_data[json_field] = {"value": question.value_from_ai}
+                        else:
+                            country_data[json_field]["value"] = question.value_from_ai
+                    else:
+                        country_data[json_field] = question.value_from_ai
+                    country.data = json.dumps(country_data)
+                    country.timestamp = datetime.utcnow()
+                    new_history_record = CountryQuizUpdatesHistory(
+                        function_name='update_countryQuiz_from_approved_questions',
+                        country_label=country_label,
+                        key=json_field,
+                        old_data=old_data,
+                        new_data=question.value_from_ai,
+                        timestamp=datetime.utcnow()
+                    )
+                    session.add(new_history_record)
+                    question.value_updated = True
+        session.commit()
+        rows += len(batch)
+    session.close()
+    return rows
+
+def update_countryQuiz_from_approved_blanks(progress=None):
+    """Atualiza o quiz com dados aprovados que estavam em branco.
+
+    Busca por atualizações aprovadas, aplica as atualizações no quiz e registra o histórico das mudanças.
+
+    Args:
+        progress (StageProgress, optional): Progresso da etapa no pipeline.
+
+    Returns:
+        int: Número de lacunas aprovadas processadas.
+    """
+    session = Session()
+    approved_updates = session.query(CountryBlanksFromSemanticDatabase)\
+        .filter(CountryBlanksFromSemanticDatabase.approved == True, CountryBlanksFromSemanticDatabase.value_updated == False)
+    rows = 0
+    for batch in iterate_batches(approved_updates, CountryBlanksFromSemanticDatabase, progress):
+        for update in batch:
+            country = session.query(CountryQuiz).filter(CountryQuiz.country_label == update.country_label).first()
             if country:
                 country_data = json.loads(country.data) if country.data else {}
-                country_label = question.country
-                old_data = question.correct_answer
-                if requires_value_key:
-                    if json_field not in country_data or not isinstance(country_data[json_field], dict):
-                        country_data[json_field] = {"value": question.value_from_ai}
-                    else:
-                        country_data[json_field]["value"] = question.value_from_ai
-                else:
-                    country_data[json_field] = question.value_from_ai
+                country_label = update.country_label
+                old_data = update.current_value
+                update_value = update.value_from_ai
+                if isinstance(country_data.get(update.key, ""), dict):
+                    update_value = {"value": update.value_from_ai}
+                country_data[update.key] = update_value
                 country.data = json.dumps(country_data)
                 country.timestamp = datetime.utcnow()
                 new_history_record = CountryQuizUpdatesHistory(
-                    function_name='update_countryQuiz_from_approved_questions',
+                    function_name='update_countryQuiz_from_approved_blanks',
                     country_label=country_label,
-                    key=json_field,
+                    key=update.key,
                     old_data=old_data,
-                    new_data=question.value_from_ai,
+                    new_data=update.value_from_ai,
                     timestamp=datetime.utcnow()
                 )
                 session.add(new_history_record)
-                question.value_updated = True
-    session.commit()
+                update.value_updated = True
+        session.commit()
+        rows += len(batch)
     session.close()
+    return rows
 
-def update_countryQuiz_from_approved_blanks():
-    """Atualiza o quiz com dados aprovados que estavam em branco.
+def get_sync_timestamp(session, name):
+    """Lê o marco de sincronização registrado com o nome informado.
 
-    Busca por atualizações aprovadas, aplica as atualizações no quiz e registra o histórico das mudanças.
+    Args:
+        session: Sessão SQLAlchemy.
+        name (str): Nome do marco em SyncState.
+
+    Returns:
+        datetime: Data registrada, ou None se o marco ainda não existir.
     """
-    session = Session()
-    approved_updates = session.query(CountryBlanksFromSemanticDatabase)\
-        .filter(CountryBlanksFromSemanticDatabase.approved == True, CountryBlanksFromSemanticDatabase.value_updated == False).all()
-    for update in approved_updates:
-        country = session.query(CountryQuiz).filter(CountryQuiz.country_label == update.country_label).first()
-        if country:
-            country_data = json.loads(country.data) if country.data else {}
-            country_label = update.country_label
-            old_data = update.current_value
-            update_value = update.value_from_ai
-            if isinstance(country_data.get(update.key, ""), dict):
-                update_value = {"value": update.value_from_ai}
-            country_data[update.key] = update_value
-            country.data = json.dumps(country_data)
-            country.timestamp = datetime.utcnow()
-            new_history_record = CountryQuizUpdatesHistory(
-                function_name='update_countryQuiz_from_approved_blanks',
-                country_label=country_label,
-                key=update.key,
-                old_data=old_data,
-                new_data=update.value_from_ai,
-                timestamp=datetime.utcnow()
-            )
-            session.add(new_history_record)
-            update.value_updated = True
-    session.commit()
-    session.close()
+    state = session.query(SyncState).filter(SyncState.name == name).one_or_none()
+    return state.timestamp if state else None
+
+def set_sync_timestamp(session, name, timestamp):
+    """Registra (ou atualiza) um marco de sincronização.
+
+    Args:
+        session: Sessão SQLAlchemy.
+        name (str): Nome do marco em SyncState.
+        timestamp (datetime): Data a ser registrada.
+    """
+    state = session.query(SyncState).filter(SyncState.name == name).one_or_none()
+    if state:
+        state.timestamp = timestamp
+    else:
+        session.add(SyncState(name=name, timestamp=timestamp))
 
-def update_new_country_data_from_semanticdatabase_in_countryQuiz():
+def update_new_country_data_from_semanticdatabase_in_countryQuiz(incremental=True):
     """Atualiza o quiz com novos dados de países obtidos de fontes semânticas.
 
     Exclui países não informados na nova consulta. Compara novos dados com os existentes, atualiza conforme necessário e registra as mudanças no histórico.
+    No modo incremental busca apenas os países modificados no Wikidata desde a última sincronização; a exclusão de países
+    só é feita nas sincronizações completas, executadas a cada FULL_SYNC_INTERVAL_DAYS dias.
+
+    Args:
+        incremental (bool): Se verdadeiro, usa a sincronização incremental quando possível.
     """
     session = Session()
+    sync_started = datetime.utcnow()
+    last_sync = get_sync_timestamp(session, 'semanticdatabase_last_sync')
+    last_full_sync = get_sync_timestamp(session, 'semanticdatabase_last_full_sync')
+    full_sync = (not incremental or database != "WIKIDATA" or last_sync is None or last_full_sync is None
+                 or sync_started - last_full_sync >= timedelta(days=FULL_SYNC_INTERVAL_DAYS))
+    if not full_sync and (not WIKIDATA_SPARQL_QUERY or filter_query_by_modification(WIKIDATA_SPARQL_QUERY, sync_started) is None):
+        print("Warning: WIKIDATA_SPARQL_QUERY cannot be filtered by modification date, falling back to a full sync.")
+        full_sync = True
 
     # Teste -- carga da tabela local para teste
 #    new_data = [(json.loads(country.data), country.timestamp) for country in CountryFromSemanticDatabase.query.all()]
@@ -206,12 +419,18 @@ def update_new_country_data_from_semanticdatabase_in_countryQuiz():
     ##
 
     # Produção -- consulta Wikidata
-    new_data_full = get_country_data()
+    if full_sync:
+        print("Full sync")
+        new_data_full = get_country_data()
+    else:
+        print(f"Incremental sync of countries modified since {last_sync - SYNC_OVERLAP}")
+        new_data_full = get_country_data(modified_since=last_sync - SYNC_OVERLAP)
     new_data = [(country, datetime.utcnow()) for country in new_data_full]
     new_countries = {country['country_label']['value'] for country in new_data_full}
     ##
 
-    current_countries = {country.country_label for country in CountryFromSemanticDatabase.query.all()}
+    # Países ausentes de uma consulta incremental não foram removidos, apenas não mudaram
+    current_countries = {country.country_label for country in CountryFromSemanticDatabase.query.all()} if full_sync else set()
 
     countries_to_remove = current_countries - new_countries
     for country_label in countries_to_remove:
@@ -236,9 +455,12 @@ def update_new_country_data_from_semanticdatabase_in_countryQuiz():
         else:
           print(f"Não encontrado: {country_label}") 
 
-    current_countries_updated = {country.country_label for country in CountryFromSemanticDatabase.query.all()}
-    current_CountryQuiz_countries = {country.country_label for country in CountryQuiz.query.all()}
-    CountryQuiz_countries_to_remove = current_CountryQuiz_countries - current_countries_updated
+    if full_sync:
+        current_countries_updated = {country.country_label for country in CountryFromSemanticDatabase.query.all()}
+        current_CountryQuiz_countries = {country.country_label for country in CountryQuiz.query.all()}
+        CountryQuiz_countries_to_remove = current_CountryQuiz_countries - current_countries_updated
+    else:
+        CountryQuiz_countries_to_remove = set()
     for country_label in CountryQuiz_countries_to_remove:
         print(f"Procurando por: {country_label} em CountryQuiz")
         # Remove da tabela 'CountryQuiz'
@@ -261,7 +483,8 @@ def update_new_country_data_from_semanticdatabase_in_countryQuiz():
         else:
           print(f"Não encontrado: {country_label}")
 
-    existing_data = {item.country_label: (json.loads(item.data), item.timestamp) for item in session.query(CountryQuiz).all()}
+    existing_data = {item.country_label: (json.loads(item.data), item.timestamp)
+                     for item in session.query(CountryQuiz).filter(CountryQuiz.country_label.in_(new_countries)).all()}
     updates_count = 0
     for new_country, new_timestamp in new_data:
         label = new_country['country_label']['value']
@@ -314,14 +537,63 @@ def update_new_country_data_from_semanticdatabase_in_countryQuiz():
                     )
                     session.add(new_history_record)
                     updates_count += 1
+    set_sync_timestamp(session, 'semanticdatabase_last_sync', sync_started)
+    if full_sync:
+        set_sync_timestamp(session, 'semanticdatabase_last_full_sync', sync_started)
     session.commit()  # Commit das alterações
     session.close()   # Encerramento da sessão com o banco de dados
     print(f"Updated {updates_count} fields in CountryQuiz.")
+    return updates_count
+
+def prewarm_media_cache():
+    """Baixa para o cache local as bandeiras e hinos de CountryQuiz que ainda não estão em cache."""
+    session = Session()
+    media = []
+    for country in session.query(CountryQuiz).all():
+        country_data = json.loads(country.data)
+        media.append((country_data.get('flag_image', {}).get('value', ''), 'flag'))
+        media.append((country_data.get('anthem_audio', {}).get('value', ''), 'anthem'))
+    session.close()
+    counters = media_cache.prewarm(media)
+    print(f"Media cache: {counters['downloaded']} downloaded, {counters['cached']} already cached, {counters['skipped']} not resizable, {counters['failed']} failed.")
+    return len(media)
+
+# Os dois preenchimentos por IA, e suas validações, são independentes e rodam em paralelo; as etapas que alteram
+# CountryQuiz rodam em sequência
+PIPELINE_STAGES = [
+    Stage('reported_ai', update_reported_questions_with_ai,
+          pending=lambda: count_rows(ReportedQuestion, ReportedQuestion.value_from_ai.is_(""))),
+    Stage('blanks_ai', update_country_blanks_from_semanticdatabase_with_ai,
+          pending=lambda: count_rows(CountryBlanksFromSemanticDatabase, CountryBlanksFromSemanticDatabase.value_from_ai.is_(""))),
+    Stage('validate_questions', validate_reported_questions, depends_on=['reported_ai'],
+          pending=lambda: count_rows(ReportedQuestion, ReportedQuestion.value_from_ai != "", ReportedQuestion.approved == False, ReportedQuestion.value_updated == False)),
+    Stage('validate_blanks', validate_country_blanks, depends_on=['blanks_ai'],
+          pending=lambda: count_rows(CountryBlanksFromSemanticDatabase, CountryBlanksFromSemanticDatabase.value_from_ai != "", CountryBlanksFromSemanticDatabase.approved == False, CountryBlanksFromSemanticDatabase.value_updated == False)),
+    Stage('apply_questions', update_countryQuiz_from_approved_questions, depends_on=['validate_questions'],
+          pending=lambda: count_rows(ReportedQuestion, ReportedQuestion.approved == True, ReportedQuestion.value_updated == False)),
+    Stage('apply_blanks', update_countryQuiz_from_approved_blanks, depends_on=['validate_blanks', 'apply_questions'],
+          pending=lambda: count_rows(CountryBlanksFromSemanticDatabase, CountryBlanksFromSemanticDatabase.approved == True, CountryBlanksFromSemanticDatabase.value_updated == False)),
+    Stage('sync', lambda progress: update_new_country_data_from_semanticdatabase_in_countryQuiz(), depends_on=['apply_blanks']),
+    Stage('prewarm_media', lambda progress: prewarm_media_cache(), depends_on=['sync']),
+]
 
 if __name__ == "__main__":
-    pass
-    update_reported_questions_with_ai()
-    update_country_blanks_from_semanticdatabase_with_ai()
-    update_countryQuiz_from_approved_questions()
-    update_countryQuiz_from_approved_blanks()
-    update_new_country_data_from_semanticdatabase_in_countryQuiz()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Atualiza os dados de países do quiz.")
+    parser.add_argument('--only', help="Etapas executadas, separadas por vírgula: " + ", ".join(stage.name for stage in PIPELINE_STAGES))
+    parser.add_argument('--dry-run', action='store_true', help="Mostra as etapas que seriam executadas, sem executá-las")
+    args = parser.parse_args()
+    # Com profile_stages ligado, cada etapa gera um arquivo .folded em profile_dir
+    pipeline = Pipeline(PIPELINE_STAGES, PIPELINE_CHECKPOINT, workers=PIPELINE_WORKERS,
+                        wrap=lambda name: profile_block(profiling.sampler, profiling.directory, f"stage {name}", enabled=PROFILE_STAGES))
+    only = [name.strip() for name in args.only.split(',') if name.strip()] if args.only else None
+    try:
+        if args.dry_run:
+            pipeline.dry_run(only)
+            sys.exit(0)
+        results = pipeline.run(only)
+    except ValueError as e:
+        parser.error(str(e))
+    for name, result in results.items():
+        print(f"{name:20} {result['status']:8} {result['rows']:6} rows {result['seconds']:8.2f} s")
+    batch_registry.write_textfile(METRICS_TEXTFILE)
+    sys.exit(1 if any(result['status'] in ('failed', 'blocked') for result in results.values()) else 0)
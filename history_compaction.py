@@ -0,0 +1,212 @@
+from app import CountryQuizUpdatesHistory, CountryQuizUpdatesHistoryRollup
+from sqlalchemy import create_engine, text, func, or_
+from sqlalchemy.orm import sessionmaker, scoped_session
+from datetime import datetime, timedelta
+import argparse
+import configparser
+import gzip
+import json
+import os
+
+config = configparser.ConfigParser()
+config.read('quiz.config')
+
+HISTORY_RETENTION_DAYS = int(config.get('settings', 'history_retention_days', fallback=os.getenv('HISTORY_RETENTION_DAYS', '90')))
+HISTORY_ARCHIVE_DIR = config.get('settings', 'history_archive_dir', fallback=os.getenv('HISTORY_ARCHIVE_DIR', 'history_archive'))
+
+DATABASE_URI = config.get('settings', 'database_uri', fallback=os.getenv('DATABASE_URI', 'sqlite:///quiz.db'))
+
+engine = create_engine(DATABASE_URI)
+session_factory = sessionmaker(bind=engine)
+Session = scoped_session(session_factory)
+
+# Códigos inteiros para os valores de 'function_name' gravados pelo data_update.py.
+# Novos eventos devem receber o próximo código livre; códigos existentes nunca mudam.
+# A tabela viva continua gravando o nome completo, legível nas consultas de auditoria; como ela só guarda o
+# período de retenção, a representação compacta é usada apenas nos resumos.
+HISTORY_EVENT_CODES = {
+    'update_countryQuiz_from_approved_questions': 1,
+    'update_countryQuiz_from_approved_blanks': 2,
+    'update_new_country_data_from_semanticdatabase_in_countryQuiz -> ancient country removed in CountryFromSemanticDatabase': 3,
+    'update_new_country_data_from_semanticdatabase_in_countryQuiz -> ancient country removed in CountryQuiz': 4,
+    'update_new_country_data_from_semanticdatabase_in_countryQuiz -> data updated': 5,
+    'update_new_country_data_from_semanticdatabase_in_countryQuiz -> new country': 6,
+}
+HISTORY_EVENT_NAMES = {code: name for name, code in HISTORY_EVENT_CODES.items()}
+UNKNOWN_EVENT_CODE = 0
+
+def event_code(function_name):
+    """Converte o nome de função gravado no histórico em seu código inteiro.
+
+    Args:
+        function_name (str): Valor da coluna 'function_name' do histórico.
+
+    Returns:
+        int: Código do evento, ou UNKNOWN_EVENT_CODE se o nome não for conhecido.
+    """
+    return HISTORY_EVENT_CODES.get(function_name, UNKNOWN_EVENT_CODE)
+
+def database_size(session):
+    """Calcula o tamanho ocupado pelo banco SQLite em bytes.
+
+    Args:
+        session: Sessão SQLAlchemy conectada ao banco.
+
+    Returns:
+        int: Número de páginas multiplicado pelo tamanho de página.
+    """
+    page_count = session.execute(text("PRAGMA page_count")).scalar()
+    page_size = session.execute(text("PRAGMA page_size")).scalar()
+    return page_count * page_size
+
+def archive_history_record(archive_file, record):
+    """Grava uma linha do histórico no arquivo de arquivamento em formato JSON lines.
+
+    Args:
+        archive_file: Arquivo gzip aberto em modo texto.
+        record (CountryQuizUpdatesHistory): Linha do histórico a ser arquivada.
+    """
+    archive_file.write(json.dumps({
+        'id': record.id,
+        'function_name': record.function_name,
+        'country_label': record.country_label,
+        'key': record.key,
+        'old_data': record.old_data,
+        'new_data': record.new_data,
+        'timestamp': record.timestamp.isoformat() if record.timestamp else None,
+    }, ensure_ascii=False) + "\n")
+
+def rollup_history_record(rollups, record):
+    """Acumula uma linha do histórico no resumo por (país, chave).
+
+    As linhas devem chegar em ordem cronológica: o primeiro evento define 'old_data' e o último define 'new_data' e o código.
+
+    Args:
+        rollups (dict): Resumos em memória indexados por (country_label, key).
+        record (CountryQuizUpdatesHistory): Linha do histórico a ser consolidada.
+    """
+    rollup_key = (record.country_label, record.key)
+    rollup = rollups.get(rollup_key)
+    if rollup is None:
+        rollups[rollup_key] = {
+            'event_code': event_code(record.function_name),
+            'old_data': record.old_data,
+            'new_data': record.new_data,
+            'events_count': 1,
+            'first_timestamp': record.timestamp,
+            'last_timestamp': record.timestamp,
+        }
+    else:
+        rollup['event_code'] = event_code(record.function_name)
+        rollup['new_data'] = record.new_data
+        rollup['events_count'] += 1
+        rollup['last_timestamp'] = record.timestamp
+
+def merge_rollups(session, rollups):
+    """Grava os resumos em CountryQuizUpdatesHistoryRollup, somando-os aos resumos de compactações anteriores.
+
+    Args:
+        session: Sessão SQLAlchemy.
+        rollups (dict): Resumos em memória indexados por (country_label, key).
+
+    Returns:
+        int: Número de linhas de resumo novas.
+    """
+    existing = {(rollup.country_label, rollup.key): rollup for rollup in session.query(CountryQuizUpdatesHistoryRollup).all()}
+    created = 0
+    for (country_label, key), values in rollups.items():
+        rollup = existing.get((country_label, key))
+        if rollup is None:
+            session.add(CountryQuizUpdatesHistoryRollup(country_label=country_label, key=key, **values))
+            created += 1
+        else:
+            # Resumos anteriores são sempre mais antigos que as linhas compactadas agora
+            rollup.event_code = values['event_code']
+            rollup.new_data = values['new_data']
+            rollup.events_count += values['events_count']
+            rollup.last_timestamp = values['last_timestamp']
+    return created
+
+def compact_history(retention_days=HISTORY_RETENTION_DAYS, archive_dir=HISTORY_ARCHIVE_DIR, dry_run=False):
+    """Arquiva, consolida e remove as linhas de CountryQuizUpdatesHistory mais antigas que o período de retenção
+    ou sem data.
+
+    As linhas antigas são gravadas integralmente em um arquivo .jsonl.gz, resumidas em uma linha por (país, chave)
+    em CountryQuizUpdatesHistoryRollup e removidas da tabela original. Ao final o banco é compactado com VACUUM.
+
+    Args:
+        retention_days (int): Número de dias de histórico mantidos sem alteração.
+        archive_dir (str): Diretório onde os arquivos compactados são gravados.
+        dry_run (bool): Se verdadeiro, apenas conta as linhas que seriam compactadas.
+
+    Returns:
+        dict: Relatório com linhas arquivadas, resumos criados, arquivo gerado e bytes recuperados.
+    """
+    session = Session()
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    # Linhas sem data não envelhecem nunca; elas são tratadas como anteriores ao período de retenção
+    is_old = or_(CountryQuizUpdatesHistory.timestamp < cutoff, CountryQuizUpdatesHistory.timestamp.is_(None))
+    old_records = session.query(CountryQuizUpdatesHistory)\
+        .filter(is_old)\
+        .order_by(CountryQuizUpdatesHistory.timestamp, CountryQuizUpdatesHistory.id)
+    report = {
+        'cutoff': cutoff.isoformat(),
+        'rows_archived': 0,
+        'rollups_created': 0,
+        'archive_path': None,
+        'bytes_before': database_size(session),
+        'bytes_after': None,
+        'bytes_reclaimed': 0,
+    }
+    if dry_run:
+        report['rows_archived'] = old_records.count()
+        session.close()
+        return report
+    max_id = session.query(func.max(CountryQuizUpdatesHistory.id)).filter(is_old).scalar()
+    if max_id is None:
+        session.close()
+        report['bytes_after'] = report['bytes_before']
+        return report
+    # Linhas gravadas durante a compactação ficam para a próxima execução
+    old_records = old_records.filter(CountryQuizUpdatesHistory.id <= max_id)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    # O maior id arquivado torna o nome único mesmo entre execuções no mesmo instante; 'x' nunca sobrescreve
+    # um arquivo existente, cujas linhas já foram removidas do banco
+    archive_path = os.path.join(archive_dir, f"history-{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}-{max_id}.jsonl.gz")
+    rollups = {}
+    with gzip.open(archive_path, 'xt', encoding='utf-8') as archive_file:
+        for record in old_records.yield_per(1000):
+            archive_history_record(archive_file, record)
+            rollup_history_record(rollups, record)
+            report['rows_archived'] += 1
+    report['archive_path'] = archive_path
+    report['rollups_created'] = merge_rollups(session, rollups)
+    session.query(CountryQuizUpdatesHistory)\
+        .filter(is_old, CountryQuizUpdatesHistory.id <= max_id)\
+        .delete(synchronize_session=False)
+    session.commit()
+    session.close()
+
+    # VACUUM não pode ser executado dentro de uma transação
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+    session = Session()
+    report['bytes_after'] = database_size(session)
+    report['bytes_reclaimed'] = report['bytes_before'] - report['bytes_after']
+    session.close()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compacta o histórico de atualizações de CountryQuiz.")
+    parser.add_argument('--retention-days', type=int, default=HISTORY_RETENTION_DAYS)
+    parser.add_argument('--archive-dir', default=HISTORY_ARCHIVE_DIR)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    report = compact_history(args.retention_days, args.archive_dir, args.dry_run)
+    if args.dry_run:
+        print(f"{report['rows_archived']} rows older than {report['cutoff']} would be compacted.")
+    else:
+        print(f"Archived {report['rows_archived']} rows to {report['archive_path']}.")
+        print(f"Created {report['rollups_created']} rollup rows.")
+        print(f"Database size: {report['bytes_before']} -> {report['bytes_after']} bytes ({report['bytes_reclaimed']} bytes reclaimed).")
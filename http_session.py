@@ -0,0 +1,21 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+# O Wikimedia recusa requisições com o User-Agent padrão das bibliotecas HTTP
+USER_AGENT = f"SWInG-CountryQuiz/1.0 (https://github.com/GSimCog/swing) python-requests/{requests.__version__}"
+
+def create_session(pool_size=10):
+    """Cria uma sessão HTTP identificada por USER_AGENT, com conexões reaproveitadas.
+
+    Args:
+        pool_size (int): Número de conexões mantidas por host, normalmente o número de threads que usam a sessão.
+
+    Returns:
+        requests.Session: Sessão configurada.
+    """
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
@@ -0,0 +1,206 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, unquote
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+import time
+import requests
+
+from http_session import create_session
+
+try:
+    from PIL import Image
+except ImportError:  # Sem o Pillow (requirements.txt), bandeiras que não vêm do Commons não são guardadas no cache
+    Image = None
+
+COMMONS_HOSTS = ('commons.wikimedia.org', 'upload.wikimedia.org')
+COMMONS_FILE_PATH = "https://commons.wikimedia.org/wiki/Special:FilePath/"
+
+class MediaCache:
+    """Cache em disco das bandeiras e hinos usados no quiz.
+
+    Cada URL é baixada uma única vez e gravada como '<sha1 da URL>.<extensão>'. Bandeiras são gravadas já
+    reduzidas para a largura exibida na página: as do Wikimedia Commons são pedidas ao próprio Commons como PNG
+    na largura desejada (o que também converte os SVGs) e as demais são reduzidas com o Pillow. Bandeiras que não
+    podem ser reduzidas, como SVGs fora do Commons, não são guardadas e continuam sendo servidas pela URL original.
+    """
+
+    def __init__(self, cache_dir, flag_width=300, timeout=10, rescan_interval=60, session=None):
+        """
+        Args:
+            cache_dir (str): Diretório onde os arquivos são gravados.
+            flag_width (int): Largura, em pixels, das bandeiras gravadas.
+            timeout (int): Tempo limite, em segundos, de cada download.
+            rescan_interval (int): Intervalo mínimo, em segundos, entre releituras do diretório após uma URL não encontrada.
+            session (requests.Session, optional): Sessão HTTP usada nos downloads; por padrão, uma sessão identificada
+                por USER_AGENT, exigido pelo Wikimedia Commons.
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.flag_width = flag_width
+        self.timeout = timeout
+        self.rescan_interval = rescan_interval
+        self.session = session if session is not None else create_session()
+        self._index = {}
+        self._scanned_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url):
+        """Calcula o nome base do arquivo de uma URL.
+
+        Args:
+            url (str): URL original da mídia.
+
+        Returns:
+            str: Hash SHA-1 hexadecimal da URL.
+        """
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def lookup(self, url):
+        """Procura o arquivo em cache de uma URL.
+
+        Arquivos gravados por outros processos (como o data_update.py) são encontrados relendo o diretório,
+        no máximo uma vez a cada 'rescan_interval' segundos.
+
+        Args:
+            url (str): URL original da mídia.
+
+        Returns:
+            str: Nome do arquivo em cache, ou None se a URL ainda não foi baixada.
+        """
+        key = self.key(url)
+        filename = self._index.get(key)
+        if filename is None and (self._scanned_at is None or time.monotonic() - self._scanned_at >= self.rescan_interval):
+            self._scan()
+            filename = self._index.get(key)
+        return filename
+
+    def _scan(self):
+        index = {}
+        if os.path.isdir(self.cache_dir):
+            for filename in os.listdir(self.cache_dir):
+                key, _, extension = filename.partition('.')
+                if extension and not extension.endswith('tmp'):
+                    index[key] = filename
+        with self._lock:
+            self._index.update(index)
+            self._scanned_at = time.monotonic()
+
+    def download_url(self, url, kind):
+        """Determina a URL efetivamente baixada para uma mídia.
+
+        Args:
+            url (str): URL original da mídia.
+            kind (str): 'flag' ou 'anthem'.
+
+        Returns:
+            tuple: URL a ser baixada e parâmetros da requisição.
+        """
+        parsed = urlparse(url)
+        if kind == 'flag' and parsed.hostname in COMMONS_HOSTS:
+            if parsed.hostname == 'upload.wikimedia.org':
+                # Arquivos originais do Commons são pedidos pelo Special:FilePath, que sabe gerar miniaturas
+                url = COMMONS_FILE_PATH + parsed.path.rsplit('/', 1)[-1]
+            return url, {'width': self.flag_width}
+        return url, {}
+
+    def fetch(self, url, kind):
+        """Baixa uma mídia, gera a versão reduzida (no caso de bandeiras) e grava o arquivo no cache.
+
+        Args:
+            url (str): URL original da mídia.
+            kind (str): 'flag' ou 'anthem'.
+
+        Returns:
+            str: Nome do arquivo gravado no cache.
+
+        Raises:
+            requests.RequestException: Se o download falhar.
+            ValueError: Se a mídia for uma bandeira que não pode ser reduzida.
+        """
+        download_url, params = self.download_url(url, kind)
+        response = self.session.get(download_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        content = response.content
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        if kind == 'flag' and not params:
+            resized = self.resize(content, content_type)
+            if resized is None:
+                raise ValueError(f"Flag cannot be resized to {self.flag_width}px ({content_type or 'unknown content type'})")
+            content, content_type = resized
+        extension = mimetypes.guess_extension(content_type) if content_type else None
+        if not extension:
+            extension = os.path.splitext(unquote(urlparse(url).path))[1] or '.bin'
+        filename = self.key(url) + extension
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_path = os.path.join(self.cache_dir, filename + '.tmp')
+        with open(temporary_path, 'wb') as media_file:
+            media_file.write(content)
+        os.replace(temporary_path, os.path.join(self.cache_dir, filename))
+        with self._lock:
+            self._index[self.key(url)] = filename
+        return filename
+
+    def resize(self, content, content_type):
+        """Reduz uma imagem raster para a largura das bandeiras, mantendo a proporção.
+
+        Args:
+            content (bytes): Conteúdo da imagem.
+            content_type (str): Tipo MIME informado pelo servidor.
+
+        Returns:
+            tuple: Conteúdo e tipo MIME da imagem reduzida (ou os originais, se ela já for estreita o bastante),
+                ou None se não for possível reduzi-la.
+        """
+        if Image is None or not content_type.startswith('image/') or content_type == 'image/svg+xml':
+            return None
+        try:
+            image = Image.open(io.BytesIO(content))
+            if image.width <= self.flag_width:
+                return content, content_type
+            height = max(1, round(image.height * self.flag_width / image.width))
+            image = image.resize((self.flag_width, height))
+            output = io.BytesIO()
+            image.save(output, format='PNG')
+            return output.getvalue(), 'image/png'
+        except Exception as e:
+            print(f"Error resizing image: {e}")
+            return None
+
+    def prewarm(self, media, workers=8):
+        """Baixa em paralelo as mídias que ainda não estão no cache.
+
+        Args:
+            media (iterable): Pares (url, kind) das mídias a serem baixadas.
+            workers (int): Número de downloads simultâneos.
+
+        Returns:
+            dict: Quantidade de mídias já em cache, baixadas, não guardadas por não poderem ser reduzidas e com erro.
+        """
+        counters = {'cached': 0, 'downloaded': 0, 'skipped': 0, 'failed': 0}
+        pending = []
+        for url, kind in set(media):
+            if not url.startswith(('http://', 'https://')):
+                continue
+            if self.lookup(url):
+                counters['cached'] += 1
+            else:
+                pending.append((url, kind))
+
+        def fetch_or_report(url, kind):
+            try:
+                self.fetch(url, kind)
+                return 'downloaded'
+            except ValueError as e:
+                print(f"Not caching {url}: {e}")
+                return 'skipped'
+            except Exception as e:
+                print(f"Error caching {url}: {e}")
+                return 'failed'
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for outcome in executor.map(lambda item: fetch_or_report(*item), pending):
+                counters[outcome] += 1
+        return counters
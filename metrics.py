@@ -0,0 +1,141 @@
+from bisect import bisect_left
+import os
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def format_labels(labels):
+    """Formata um conjunto de rótulos no formato de texto do Prometheus.
+
+    Args:
+        labels (tuple): Pares (nome, valor) dos rótulos.
+
+    Returns:
+        str: Rótulos entre chaves, ou texto vazio se não houver rótulos.
+    """
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+def format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base das métricas: guarda nome, descrição e os valores por conjunto de rótulos."""
+    kind = "untyped"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self.render_value(labels, value))
+        return lines
+
+    def render_value(self, labels, value):
+        return [f"{self.name}{format_labels(labels)} {format_value(value)}"]
+
+class Counter(Metric):
+    """Contador que só cresce, como número de requisições ou de tokens consumidos."""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Histogram(Metric):
+    """Histograma com faixas fixas, usado para latências e tamanhos."""
+    kind = "histogram"
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render_value(self, labels, value):
+        bucket_counts, total, count = value
+        lines = []
+        cumulative = 0
+        for upper_bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+            cumulative += bucket_count
+            bucket_labels = labels + (('le', format_value(upper_bound)),)
+            lines.append(f"{self.name}_bucket{format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(total)}")
+        lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+class CallbackMetric(Metric):
+    """Métrica cujo valor é lido de uma função no momento da coleta, como a profundidade de uma fila."""
+
+    def __init__(self, name, description, kind, function):
+        super().__init__(name, description)
+        self.kind = kind
+        self.function = function
+
+    def render(self):
+        self._values = {(): self.function()}
+        return super().render()
+
+class MetricsRegistry:
+    """Conjunto das métricas de um processo, exportadas no formato de texto do Prometheus."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, description):
+        return self.register(Counter(name, description))
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, buckets))
+
+    def callback(self, name, description, kind, function):
+        return self.register(CallbackMetric(name, description, kind, function))
+
+    def render(self):
+        """Gera o texto de exposição de todas as métricas registradas.
+
+        Returns:
+            str: Métricas no formato de texto do Prometheus (versão 0.0.4).
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Grava as métricas em um arquivo, para processos em lote lidos pelo textfile collector do node_exporter.
+
+        Args:
+            path (str): Caminho do arquivo .prom.
+        """
+        temporary_path = path + ".tmp"
+        with open(temporary_path, 'w') as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(temporary_path, path)
+
+registry = MetricsRegistry()  # Métricas do aplicativo web, expostas em /metrics
+batch_registry = MetricsRegistry()  # Métricas do data_update.py, gravadas no arquivo do textfile collector
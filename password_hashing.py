@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import os
+import sys
+import threading
+import time
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+class PasswordHasherBusy(Exception):
+    """Levantada quando o pool de hashing já tem o máximo de operações pendentes."""
+
+def normalize_method(method):
+    """Completa o método de hash com o número de iterações padrão do Werkzeug, como ele aparece no hash gravado.
+
+    Args:
+        method (str): Método no formato do Werkzeug, como 'pbkdf2:sha256' ou 'pbkdf2:sha256:600000'.
+
+    Returns:
+        str: Método com o número de iterações explícito, no caso do pbkdf2.
+    """
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2' and len(parts) == 2:
+        parts.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ':'.join(parts)
+
+class PasswordHasher:
+    """Geração e verificação de hashes de senha em um pool limitado de threads, com controle de admissão.
+
+    O hashing é deliberadamente caro; executá-lo fora das threads das requisições, com um limite de
+    operações simultâneas e pendentes, impede que uma rajada de logins consuma toda a CPU do processo.
+    """
+
+    def __init__(self, method='pbkdf2:sha256', salt_length=16, workers=1, max_pending=8, timeout=10, niceness=10):
+        """
+        Args:
+            method (str): Método de hash no formato do Werkzeug; hashes gravados com outro método são refeitos no login.
+            salt_length (int): Tamanho do salt.
+            workers (int): Threads que calculam hashes ao mesmo tempo.
+            max_pending (int): Operações aceitas ao mesmo tempo, incluindo as em execução; as excedentes são recusadas.
+            timeout (float): Tempo máximo, em segundos, de espera por uma operação.
+            niceness (int): Redução de prioridade das threads de hashing, onde o sistema permite prioridade por thread,
+                para que as requisições do quiz tenham preferência na CPU.
+        """
+        self.method = normalize_method(method)
+        self.salt_length = salt_length
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.niceness = niceness
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.completed_total = 0
+        self.rejected_total = 0
+        self.seconds_total = 0.0
+
+    def _get_executor(self):
+        # O pool é criado por processo, para não herdar threads de antes de um fork
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher", initializer=self._lower_priority)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _lower_priority(self):
+        # No Linux, setpriority com o id nativo da thread altera apenas a thread de hashing
+        if self.niceness and sys.platform.startswith('linux'):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), os.getpriority(os.PRIO_PROCESS, 0) + self.niceness)
+            except OSError:
+                pass
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected_total += 1
+            raise PasswordHasherBusy("Too many password operations in progress")
+        try:
+            future = self._get_executor().submit(self._timed, function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy("Password operation timed out")
+
+    def _timed(self, function, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            with self._lock:
+                self.completed_total += 1
+                self.seconds_total += time.perf_counter() - started
+
+    def hash(self, password):
+        """Gera o hash de uma senha com o método configurado.
+
+        Raises:
+            PasswordHasherBusy: Se o pool estiver cheio.
+        """
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def needs_rehash(self, stored_hash):
+        """Indica se um hash gravado usa método ou tamanho de salt diferente do configurado."""
+        parts = stored_hash.split('$')
+        return len(parts) != 3 or normalize_method(parts[0]) != self.method or len(parts[1]) != self.salt_length
+
+    def verify_and_update(self, stored_hash, password):
+        """Verifica uma senha e, se ela estiver correta e o hash estiver desatualizado, gera um novo hash.
+
+        As duas operações são feitas em uma única passagem pelo pool.
+
+        Args:
+            stored_hash (str): Hash gravado.
+            password (str): Senha informada.
+
+        Returns:
+            tuple: Se a senha está correta e o novo hash, ou None se não for preciso atualizá-lo.
+
+        Raises:
+            PasswordHasherBusy: Se o pool estiver cheio.
+        """
+        return self._run(self._verify_and_update, stored_hash, password)
+
+    def _verify_and_update(self, stored_hash, password):
+        if not check_password_hash(stored_hash, password):
+            return False, None
+        if self.needs_rehash(stored_hash):
+            return True, generate_password_hash(password, self.method, self.salt_length)
+        return True, None
+
+    def stats(self):
+        """Retorna a configuração e os contadores do pool."""
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'in_flight': self.max_pending - self._slots._value,
+            'completed_total': self.completed_total,
+            'rejected_total': self.rejected_total,
+            'seconds_total': self.seconds_total,
+        }
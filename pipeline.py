@@ -0,0 +1,263 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+from datetime import datetime
+import json
+import os
+import threading
+import time
+import uuid
+
+from metrics import batch_registry
+
+stage_duration = batch_registry.histogram('quiz_pipeline_stage_duration_seconds', 'Wall time of each data update pipeline stage.')
+stage_rows = batch_registry.counter('quiz_pipeline_stage_rows_total', 'Rows processed by each data update pipeline stage.')
+stage_failures = batch_registry.counter('quiz_pipeline_stage_failures_total', 'Failed data update pipeline stages.')
+
+class Stage:
+    """Etapa do pipeline: uma função que recebe o progresso da etapa e retorna o número de linhas processadas."""
+
+    def __init__(self, name, function, depends_on=(), pending=None):
+        """
+        Args:
+            name (str): Nome da etapa, usado em --only e no checkpoint.
+            function (callable): Função chamada com um StageProgress; retorna o número de linhas processadas.
+            depends_on (iterable): Nomes das etapas que precisam terminar antes desta.
+            pending (callable, optional): Função sem argumentos que conta as linhas pendentes, exibida em --dry-run.
+        """
+        self.name = name
+        self.function = function
+        self.depends_on = tuple(depends_on)
+        self.pending = pending
+
+class Checkpoint:
+    """Progresso de uma execução do pipeline, gravado em um arquivo JSON para retomar execuções interrompidas.
+
+    O arquivo identifica a execução em andamento; as etapas concluídas só são puladas quando essa mesma execução,
+    interrompida antes de terminar, é retomada. O progresso parcial de uma etapa (último id processado) vale
+    para qualquer execução seguinte.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.run = None
+        self.stages = {}
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                data = json.load(checkpoint_file)
+            self.run = data.get('run')
+            self.stages = data.get('stages', {})
+
+    def interrupted(self, names):
+        """Indica se o checkpoint é de uma execução das mesmas etapas que foi interrompida antes de terminar."""
+        with self._lock:
+            return self.run is not None and self.run['stages'] == sorted(names)
+
+    def start_run(self, names):
+        """Registra o início de uma nova execução, descartando as etapas concluídas em execuções anteriores.
+
+        Args:
+            names (iterable): Nomes das etapas executadas.
+        """
+        with self._lock:
+            self.run = {'id': uuid.uuid4().hex, 'started': datetime.utcnow().isoformat(), 'stages': sorted(names)}
+            self.stages = {name: state for name, state in self.stages.items() if not state['done']}
+            self._write()
+
+    def finish_run(self, names):
+        """Registra o fim de uma execução, com ou sem falhas, removendo as etapas concluídas nela.
+
+        O arquivo é apagado quando não resta o progresso parcial de nenhuma etapa.
+
+        Args:
+            names (iterable): Nomes das etapas executadas.
+        """
+        with self._lock:
+            self.run = None
+            for name in names:
+                if self.stages.get(name, {}).get('done'):
+                    del self.stages[name]
+            if self.stages:
+                self._write()
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+
+    def state(self, name):
+        """Retorna o estado de uma etapa: se terminou, o último id processado e as linhas processadas."""
+        with self._lock:
+            return dict(self.stages.get(name, {'done': False, 'last_id': 0, 'rows': 0}))
+
+    def update(self, name, **values):
+        """Altera o estado de uma etapa e grava o arquivo de forma atômica."""
+        with self._lock:
+            state = self.stages.setdefault(name, {'done': False, 'last_id': 0, 'rows': 0})
+            state.update(values)
+            self._write()
+
+    def _write(self):
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump({'updated': time.time(), 'run': self.run, 'stages': self.stages}, checkpoint_file, indent=2)
+        os.replace(temporary_path, self.path)
+
+class StageProgress:
+    """Progresso de uma etapa em execução, registrado no checkpoint a cada lote de linhas."""
+
+    def __init__(self, checkpoint, name):
+        self.checkpoint = checkpoint
+        self.name = name
+        state = checkpoint.state(name)
+        self.last_id = state['last_id']
+        self.rows = state['rows']
+
+    def advance(self, last_id, rows):
+        """Registra um lote concluído.
+
+        Args:
+            last_id (int): Maior id processado até aqui; as execuções retomadas continuam a partir dele.
+            rows (int): Linhas processadas no lote.
+        """
+        self.last_id = last_id
+        self.rows += rows
+        self.checkpoint.update(self.name, last_id=last_id, rows=self.rows)
+
+class Pipeline:
+    """Executa etapas organizadas em um grafo de dependências, com as etapas independentes em paralelo."""
+
+    def __init__(self, stages, checkpoint_path, workers=4, wrap=None):
+        """
+        Args:
+            stages (list): Etapas do pipeline.
+            checkpoint_path (str): Arquivo JSON do checkpoint.
+            workers (int): Número máximo de etapas executadas ao mesmo tempo.
+            wrap (callable, optional): Função que recebe o nome de uma etapa e retorna um gerenciador de contexto
+                em volta da sua execução, como o perfilamento.
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.wrap = wrap or (lambda name: nullcontext())
+        for stage in stages:
+            unknown = [name for name in stage.depends_on if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {', '.join(unknown)}")
+
+    def plan(self, only=None):
+        """Ordena as etapas selecionadas de forma que cada uma venha depois das suas dependências.
+
+        Args:
+            only (list, optional): Nomes das etapas executadas; por padrão, todas. Dependências fora da seleção
+                são consideradas satisfeitas.
+
+        Returns:
+            list: Etapas selecionadas, em ordem topológica.
+        """
+        selected = list(self.stages) if not only else list(only)
+        unknown = [name for name in selected if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown stages: {', '.join(unknown)}. Available: {', '.join(self.stages)}")
+        ordered = []
+        remaining = [self.stages[name] for name in self.stages if name in selected]
+        while remaining:
+            ready = [stage for stage in remaining
+                     if all(name not in selected or name in [done.name for done in ordered] for name in stage.depends_on)]
+            if not ready:
+                raise ValueError(f"Dependency cycle among stages: {', '.join(stage.name for stage in remaining)}")
+            ordered.extend(ready)
+            remaining = [stage for stage in remaining if stage not in ready]
+        return ordered
+
+    def dry_run(self, only=None):
+        """Mostra as etapas que seriam executadas, o estado no checkpoint e as linhas pendentes, sem executá-las."""
+        checkpoint = Checkpoint(self.checkpoint_path)
+        stages = self.plan(only)
+        resuming = checkpoint.interrupted(stage.name for stage in stages)
+        if resuming:
+            print(f"Would resume the run started at {checkpoint.run['started']}.")
+        for stage in stages:
+            state = checkpoint.state(stage.name)
+            if state['done'] and resuming:
+                status = "done in the interrupted run, would be skipped"
+            elif state['done']:
+                status = "done in a previous run, would run again"
+            elif state['last_id']:
+                status = f"would resume after id {state['last_id']}"
+            else:
+                status = "would run"
+            pending = f", {stage.pending()} rows pending" if stage.pending else ""
+            depends_on = f" (after {', '.join(stage.depends_on)})" if stage.depends_on else ""
+            print(f"{stage.name}{depends_on}: {status}{pending}")
+
+    def run(self, only=None):
+        """Executa as etapas selecionadas, retomando a partir do checkpoint de uma execução interrompida.
+
+        Uma etapa que falha bloqueia as que dependem dela, mas não as demais. As etapas concluídas só são puladas
+        ao retomar uma execução interrompida das mesmas etapas; ao final de cada execução, com ou sem falhas,
+        elas são removidas do checkpoint, que mantém apenas o progresso parcial das etapas que falharam.
+
+        Args:
+            only (list, optional): Nomes das etapas executadas; por padrão, todas.
+
+        Returns:
+            dict: Estado, linhas processadas e duração, em segundos, de cada etapa.
+        """
+        stages = self.plan(only)
+        selected = {stage.name for stage in stages}
+        checkpoint = Checkpoint(self.checkpoint_path)
+        if checkpoint.interrupted(selected):
+            print(f"Resuming the run started at {checkpoint.run['started']}.")
+        else:
+            checkpoint.start_run(selected)
+        results = {}
+        finished = set()
+        waiting = list(stages)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while waiting or running:
+                ready = [stage for stage in waiting
+                         if all(name not in selected or name in finished for name in stage.depends_on)]
+                skipped = False
+                for stage in ready:
+                    waiting.remove(stage)
+                    if checkpoint.state(stage.name)['done']:
+                        print(f"Stage {stage.name} already done in the interrupted run, skipping.")
+                        results[stage.name] = {'status': 'skipped', 'rows': 0, 'seconds': 0.0}
+                        finished.add(stage.name)
+                        skipped = True
+                    else:
+                        running[executor.submit(self.run_stage, stage, checkpoint)] = stage.name
+                if skipped:
+                    continue  # Etapas puladas podem liberar outras imediatamente
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    if results[name]['status'] == 'done':
+                        finished.add(name)
+        for stage in waiting:
+            results[stage.name] = {'status': 'blocked', 'rows': 0, 'seconds': 0.0}
+        checkpoint.finish_run(selected)
+        return {stage.name: results[stage.name] for stage in stages}
+
+    def run_stage(self, stage, checkpoint):
+        """Executa uma etapa e registra a conclusão no checkpoint."""
+        progress = StageProgress(checkpoint, stage.name)
+        if progress.last_id:
+            print(f"Stage {stage.name} resuming after id {progress.last_id}.")
+        started = time.perf_counter()
+        try:
+            with self.wrap(stage.name):
+                rows = stage.function(progress) or 0
+        except Exception as e:
+            seconds = time.perf_counter() - started
+            stage_failures.inc(stage=stage.name)
+            print(f"Stage {stage.name} failed after {seconds:.2f} s: {e}")
+            return {'status': 'failed', 'rows': 0, 'seconds': seconds, 'error': str(e)}
+        seconds = time.perf_counter() - started
+        checkpoint.update(stage.name, done=True)
+        stage_duration.observe(seconds, stage=stage.name)
+        stage_rows.inc(rows, stage=stage.name)
+        print(f"Stage {stage.name}: {rows} rows in {seconds:.2f} s")
+        return {'status': 'done', 'rows': rows, 'seconds': seconds}
@@ -0,0 +1,151 @@
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+import os
+import re
+import sys
+import threading
+import time
+
+class Profile:
+    """Amostras de pilha coletadas de uma thread, no formato 'collapsed stacks' usado pelos flamegraphs."""
+
+    def __init__(self, thread_id, label):
+        self.thread_id = thread_id
+        self.label = label
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+
+    def write(self, directory, duration, slow=False):
+        """Grava as amostras em um arquivo .folded, uma pilha por linha seguida do número de amostras.
+
+        Args:
+            directory (str): Diretório de saída.
+            duration (float): Duração, em segundos, do trecho perfilado.
+            slow (bool): Se verdadeiro, o nome do arquivo é marcado como lento.
+
+        Returns:
+            str: Caminho do arquivo gravado.
+        """
+        os.makedirs(directory, exist_ok=True)
+        safe_label = re.sub(r'[^A-Za-z0-9_.-]+', '_', self.label).strip('_')
+        filename = f"{safe_label}-{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}-{duration * 1000:.0f}ms{'-slow' if slow else ''}.folded"
+        path = os.path.join(directory, filename)
+        with open(path, 'w') as profile_file:
+            for stack, samples in self.stacks.most_common():
+                profile_file.write(f"{stack} {samples}\n")
+        return path
+
+def collapse_stack(frame):
+    """Converte uma pilha de execução em uma linha 'raiz;...;folha'.
+
+    Args:
+        frame: Quadro mais interno da pilha.
+
+    Returns:
+        str: Funções da pilha separadas por ';', da mais externa para a mais interna.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class StackSampler:
+    """Amostrador de pilhas por intervalo de tempo, compartilhado por todos os perfis ativos do processo.
+
+    A thread de amostragem só existe enquanto há algum perfil ativo; sem perfis, o custo é nulo.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, label, thread_id=None):
+        """Começa a amostrar uma thread.
+
+        Args:
+            label (str): Rótulo do perfil, como a rota ou a etapa.
+            thread_id (int, optional): Identificador da thread; por padrão, a thread atual.
+
+        Returns:
+            Profile: Perfil que acumula as amostras.
+        """
+        profile = Profile(thread_id or threading.get_ident(), label)
+        with self._lock:
+            self._profiles[id(profile)] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="stack-sampler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def stop(self, profile):
+        """Encerra a amostragem de um perfil.
+
+        Args:
+            profile (Profile): Perfil retornado por start().
+
+        Returns:
+            float: Duração do perfil, em segundos.
+        """
+        with self._lock:
+            self._profiles.pop(id(profile), None)
+        return time.perf_counter() - profile.started
+
+    def _sample(self):
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles.values())
+            frames = sys._current_frames()
+            for profile in profiles:
+                frame = frames.get(profile.thread_id)
+                if frame is not None:
+                    profile.stacks[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+class ProfilingSettings:
+    """Estado do perfilamento sob demanda das requisições de um processo."""
+
+    def __init__(self, directory, sample_rate=0.01, slow_threshold_ms=1000, interval=0.005):
+        self.enabled = False
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_threshold_ms = slow_threshold_ms
+        self.sampler = StackSampler(interval)
+
+    def as_dict(self):
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'sample_rate': self.sample_rate,
+            'slow_threshold_ms': self.slow_threshold_ms,
+            'interval': self.sampler.interval,
+        }
+
+@contextmanager
+def profile_block(sampler, directory, label, enabled=True):
+    """Perfila um trecho de código inteiro, como uma etapa do data_update.py, gravando o resultado ao final.
+
+    Args:
+        sampler (StackSampler): Amostrador usado.
+        directory (str): Diretório de saída.
+        label (str): Rótulo do perfil.
+        enabled (bool): Se falso, o trecho é executado sem perfilamento.
+    """
+    if not enabled:
+        yield
+        return
+    profile = sampler.start(label)
+    try:
+        yield
+    finally:
+        duration = sampler.stop(profile)
+        path = profile.write(directory, duration)
+        print(f"Profile of {label} written to {path}")
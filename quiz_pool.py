@@ -0,0 +1,155 @@
+from collections import deque
+import os
+import threading
+import time
+
+class QuizPool:
+    """Reserva de perguntas já geradas, separadas por tipo de questão, mantida por processo e reabastecida por
+    uma thread em segundo plano.
+
+    Os quizzes são montados na hora a partir da reserva, com os tipos de questão escolhidos para cada usuário.
+    Cada pergunta é guardada junto com a versão dos dados de países usada para gerá-la; perguntas de versões
+    anteriores são descartadas em vez de servidas.
+    """
+
+    def __init__(self, generate, snapshot_version, keys, size=32, rate_window=60):
+        """
+        Args:
+            generate (callable): Função que recebe um tipo de questão e gera uma pergunta desse tipo, ou None se o tipo
+                não tiver países elegíveis; nesse caso, o tipo deixa de ser reabastecido até a próxima versão dos dados.
+            snapshot_version (callable): Função sem argumentos que retorna a versão atual dos dados de países.
+            keys (list): Tipos de questão mantidos na reserva.
+            size (int): Número máximo de perguntas mantidas na reserva de cada tipo.
+            rate_window (int): Janela, em segundos, usada para calcular a taxa de reabastecimento.
+        """
+        self.generate = generate
+        self.snapshot_version = snapshot_version
+        self.keys = list(keys)
+        self.size = size
+        self.rate_window = rate_window
+        self._queues = {key: deque() for key in self.keys}
+        self._exhausted = {}  # Versão dos dados em que cada tipo sem países elegíveis foi detectado
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._generated_at = deque()
+        self.generated_total = 0
+        self.served_total = 0
+        self.misses_total = 0
+        self.invalidated_total = 0
+
+    def take(self, key, accept=None):
+        """Retira da reserva uma pergunta de um tipo.
+
+        As perguntas recusadas por 'accept' (como as de países perguntados recentemente ao usuário) continuam
+        na reserva, para outros usuários.
+
+        Args:
+            key (str): Tipo de questão.
+            accept (callable, optional): Função que recebe uma pergunta e indica se ela pode ser usada.
+
+        Returns:
+            Pergunta gerada a partir da versão atual dos dados de países, ou None se nenhuma pergunta da reserva
+            foi aceita; nesse caso, cabe a quem chamou gerá-la na hora.
+        """
+        self._ensure_started()
+        version = self.snapshot_version()
+        with self._lock:
+            queue = self._queues[key]
+            self._discard_stale(queue, version)
+            for position, (_, item) in enumerate(queue):
+                if accept is None or accept(item):
+                    del queue[position]
+                    self.served_total += 1
+                    self._wakeup.set()
+                    return item
+            self.misses_total += 1
+        self._wakeup.set()
+        return None
+
+    def invalidate(self):
+        """Descarta todas as perguntas da reserva e pede um novo reabastecimento."""
+        with self._lock:
+            for queue in self._queues.values():
+                self.invalidated_total += len(queue)
+                queue.clear()
+        self._wakeup.set()
+
+    def stats(self):
+        """Resume o estado da reserva para monitoramento.
+
+        Returns:
+            dict: Profundidade total e por tipo, capacidade por tipo, contadores e taxa de reabastecimento
+                (perguntas por segundo).
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire_generated_at(now)
+            refill_rate = len(self._generated_at) / self.rate_window
+            return {
+                'depth': sum(len(queue) for queue in self._queues.values()),
+                'depth_by_key': {key: len(queue) for key, queue in self._queues.items()},
+                'size': self.size,
+                'generated_total': self.generated_total,
+                'served_total': self.served_total,
+                'misses_total': self.misses_total,
+                'invalidated_total': self.invalidated_total,
+                'refill_rate': refill_rate,
+            }
+
+    def _discard_stale(self, queue, version):
+        # As perguntas entram em ordem de versão, então as desatualizadas estão sempre no início
+        while queue and queue[0][0] != version:
+            queue.popleft()
+            self.invalidated_total += 1
+
+    def _expire_generated_at(self, now):
+        while self._generated_at and now - self._generated_at[0] > self.rate_window:
+            self._generated_at.popleft()
+
+    def _ensure_started(self):
+        # A thread é iniciada no primeiro uso de cada processo, para funcionar com servidores que fazem fork dos workers
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                for queue in self._queues.values():
+                    queue.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._refill, name="quiz-pool-refill", daemon=True)
+                self._thread.start()
+                self._wakeup.set()
+
+    def _refill(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                version = self.snapshot_version()
+                with self._lock:
+                    for queue in self._queues.values():
+                        self._discard_stale(queue, version)
+                    keys = [key for key in self.keys if self._exhausted.get(key) != version]
+                    if not keys:
+                        break
+                    # O tipo com a reserva mais vazia é reabastecido primeiro
+                    key = min(keys, key=lambda key: len(self._queues[key]))
+                    if len(self._queues[key]) >= self.size:
+                        break
+                try:
+                    item = self.generate(key)
+                except Exception as e:
+                    print(f"Error generating question for the pool: {e}")
+                    break
+                if item is None:
+                    with self._lock:
+                        self._exhausted[key] = version
+                    print(f"No eligible countries for {key}, not refilling it until the country data is reloaded.")
+                    continue
+                with self._lock:
+                    now = time.monotonic()
+                    self._queues[key].append((version, item))
+                    self.generated_total += 1
+                    self._generated_at.append(now)
+                    self._expire_generated_at(now)
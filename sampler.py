@@ -0,0 +1,167 @@
+import math
+import random
+import threading
+
+class AliasTable:
+    """Tabela de alias (método de Vose) para sorteio ponderado em tempo constante.
+
+    A construção custa O(n); cada sorteio usa dois números aleatórios e um acesso à tabela.
+    """
+
+    def __init__(self, weights):
+        """
+        Args:
+            weights (list): Pesos não negativos de cada posição.
+        """
+        size = len(weights)
+        self.size = size
+        self.total = float(sum(weights))
+        self.probability = [1.0] * size
+        self.alias = list(range(size))
+        if size == 0 or self.total <= 0:
+            return
+        scaled = [weight * size / self.total for weight in weights]
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            lower = small.pop()
+            upper = large.pop()
+            self.probability[lower] = scaled[lower]
+            self.alias[lower] = upper
+            scaled[upper] = scaled[upper] + scaled[lower] - 1.0
+            (small if scaled[upper] < 1.0 else large).append(upper)
+        # O que sobra nas listas tem probabilidade 1, a menos de erros de arredondamento
+
+    def sample(self, rng=random):
+        """Sorteia uma posição com probabilidade proporcional ao seu peso.
+
+        Returns:
+            int: Posição sorteada, ou None se todos os pesos forem zero.
+        """
+        if self.total <= 0:
+            return None
+        column = int(rng.random() * self.size)
+        return column if rng.random() < self.probability[column] else self.alias[column]
+
+class WeightedSampler:
+    """Sorteio ponderado em tempo constante com atualização incremental de pesos.
+
+    As posições são divididas em blocos de tamanho ~sqrt(n), cada um com sua tabela de alias, e uma tabela
+    de alias de nível superior sorteia o bloco pelo peso total. Alterar um peso reconstrói apenas o bloco
+    afetado e a tabela superior, em O(sqrt(n)), enquanto cada sorteio continua O(1).
+    """
+
+    def __init__(self, weights, block_size=None):
+        """
+        Args:
+            weights (list): Peso inicial de cada posição.
+            block_size (int, optional): Tamanho dos blocos; por padrão, a raiz quadrada do número de posições.
+        """
+        self.weights = list(weights)
+        self.block_size = block_size or max(1, int(math.sqrt(len(self.weights))))
+        self._lock = threading.Lock()
+        self._blocks = [AliasTable(self.weights[start:start + self.block_size])
+                        for start in range(0, len(self.weights), self.block_size)]
+        self._top = AliasTable([block.total for block in self._blocks])
+
+    def __len__(self):
+        return len(self.weights)
+
+    @property
+    def total(self):
+        return self._top.total
+
+    def update(self, index, weight):
+        """Altera o peso de uma posição.
+
+        Args:
+            index (int): Posição alterada.
+            weight (float): Novo peso, não negativo.
+        """
+        with self._lock:
+            if self.weights[index] == weight:
+                return
+            self.weights[index] = weight
+            block = index // self.block_size
+            start = block * self.block_size
+            # As tabelas são substituídas inteiras, de forma que sorteios concorrentes nunca veem uma tabela pela metade
+            self._blocks[block] = AliasTable(self.weights[start:start + self.block_size])
+            self._top = AliasTable([table.total for table in self._blocks])
+
+    def sample(self, rng=random, exclude=None, attempts=32):
+        """Sorteia uma posição com probabilidade proporcional ao seu peso.
+
+        Args:
+            rng: Gerador de números aleatórios.
+            exclude (callable, optional): Função que recebe uma posição e retorna verdadeiro se ela deve ser rejeitada.
+            attempts (int): Número máximo de sorteios antes de desistir.
+
+        Returns:
+            int: Posição sorteada, ou None se não houver posição com peso positivo que não seja rejeitada.
+        """
+        for _ in range(attempts):
+            block = self._top.sample(rng)
+            if block is None:
+                return None
+            offset = self._blocks[block].sample(rng)
+            if offset is None:
+                continue
+            index = block * self.block_size + offset
+            if exclude is None or not exclude(index):
+                return index
+        return None
+
+def sample_distinct(population, count, excluded=(), rng=random):
+    """Sorteia valores distintos de uma lista, sem repetição e ignorando os valores excluídos.
+
+    Usa rejeição, com custo constante esperado quando a lista é bem maior que a quantidade pedida.
+
+    Args:
+        population (list): Valores possíveis, sem repetições.
+        count (int): Quantidade de valores sorteados.
+        excluded (iterable): Valores que não podem ser sorteados.
+        rng: Gerador de números aleatórios.
+
+    Returns:
+        list: Valores sorteados.
+    """
+    excluded = set(excluded)
+    if len(population) <= 4 * (count + len(excluded)):
+        return rng.sample([value for value in population if value not in excluded], count)
+    chosen = []
+    while len(chosen) < count:
+        value = population[int(rng.random() * len(population))]
+        if value not in excluded:
+            excluded.add(value)
+            chosen.append(value)
+    return chosen
+
+class RecentBitset:
+    """Conjunto de posições perguntadas recentemente a um usuário, guardado como um inteiro de bits."""
+
+    def __init__(self, bits=0, limit=None):
+        """
+        Args:
+            bits (int): Bits já marcados.
+            limit (int, optional): Quantidade máxima de posições; ao ultrapassá-la, o conjunto recomeça.
+        """
+        self.bits = bits
+        self.limit = limit
+
+    def __contains__(self, index):
+        return index is not None and (self.bits >> index) & 1 == 1
+
+    def __len__(self):
+        return bin(self.bits).count("1")
+
+    def add(self, index):
+        self.bits |= 1 << index
+        if self.limit is not None and len(self) > self.limit:
+            self.bits = 1 << index
+
+    def to_hex(self):
+        return format(self.bits, 'x')
+
+    @classmethod
+    def from_hex(cls, value, limit=None):
+        return cls(int(value, 16) if value else 0, limit)
@@ -0,0 +1,184 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+import re
+import time
+import requests
+
+from http_session import create_session
+
+# Tipos de conteúdo aceitos para cada campo com URL
+URL_FIELDS = {
+    'flag_image': ('image/',),
+    'anthem_audio': ('audio/', 'application/ogg', 'video/ogg'),
+}
+POPULATION_PATTERN = re.compile(r'\d+')
+URL_PATTERN = re.compile(r'https?://[^\s/$.?#][^\s]*', re.IGNORECASE)
+CONTINENTS = frozenset(name.lower() for name in (
+    'Africa', 'Antarctica', 'Asia', 'Europe', 'North America', 'South America', 'Oceania', 'Insular Oceania', 'Australia',
+))
+# Campos com valores enumerados; respostas com mais de um valor usam 'or' como separador, como pedido nos prompts
+ENUM_FIELDS = {
+    'continent_label': CONTINENTS,
+}
+MAX_TEXT_LENGTH = 255
+MAX_REDIRECTS = 5
+# Respostas que indicam recusa do servidor em atender o validador, e não um valor inválido
+UNVERIFIED_STATUS_CODES = (401, 403, 408, 429)
+
+def check_populations(values):
+    """Valida um lote de populações: cada valor deve ser um número inteiro, só com dígitos.
+
+    Args:
+        values (list): Valores propostos.
+
+    Returns:
+        list: Tuplas (válido, motivo) na ordem dos valores.
+    """
+    return [(True, "") if POPULATION_PATTERN.fullmatch(value.strip()) else (False, "population is not a plain integer")
+            for value in values]
+
+def check_enumerated(values, allowed):
+    """Valida um lote de valores enumerados, aceitando vários valores separados por 'or'.
+
+    Args:
+        values (list): Valores propostos.
+        allowed (frozenset): Valores permitidos, em minúsculas.
+
+    Returns:
+        list: Tuplas (válido, motivo) na ordem dos valores.
+    """
+    results = []
+    for value in values:
+        unknown = [part for part in (part.strip().lower() for part in value.split(' or ')) if part not in allowed]
+        results.append((False, f"unknown value: {', '.join(unknown)}") if unknown else (True, ""))
+    return results
+
+def check_texts(values):
+    """Valida um lote de valores de texto livre, recusando apenas respostas vazias ou que não cabem em um campo."""
+    results = []
+    for value in values:
+        if not value.strip():
+            results.append((False, "empty value"))
+        elif '\n' in value or len(value) > MAX_TEXT_LENGTH:
+            results.append((False, "answer is not a single value"))
+        else:
+            results.append((True, ""))
+    return results
+
+class ValueValidator:
+    """Validação dos valores propostos pela IA antes da revisão do admin.
+
+    URLs são verificadas com requisições HEAD concorrentes, em uma sessão HTTP com conexões reaproveitadas;
+    os demais campos são verificados em lote, por campo. Cada valor recebe True (válido), False (inválido)
+    ou None (não foi possível verificar, como em um timeout), e só os inválidos devem ser rejeitados.
+    """
+
+    def __init__(self, timeout=5, workers=8, session=None):
+        """
+        Args:
+            timeout (float): Prazo total, em segundos, da verificação de cada URL, incluindo redirecionamentos e a
+                tentativa com GET. Cada requisição usa o tempo restante como limite para conectar e para receber
+                cada parte da resposta; o corpo nunca é baixado.
+            workers (int): Número de URLs verificadas ao mesmo tempo.
+            session (requests.Session, optional): Sessão HTTP usada; por padrão, uma sessão identificada pelo USER_AGENT de http_session,
+                com 'workers' conexões por host.
+        """
+        self.timeout = timeout
+        self.workers = workers
+        self.session = session if session is not None else create_session(workers)
+
+    def request(self, method, url, deadline):
+        """Executa uma requisição seguindo os redirecionamentos, sem ultrapassar o prazo.
+
+        Args:
+            method (str): 'HEAD' ou 'GET'; o corpo da resposta ao GET não é baixado.
+            url (str): URL requisitada.
+            deadline (float): Prazo final, no relógio de time.monotonic().
+
+        Returns:
+            requests.Response: Resposta final, já fechada.
+
+        Raises:
+            requests.Timeout: Se o prazo se esgotar.
+            requests.TooManyRedirects: Se houver mais de MAX_REDIRECTS redirecionamentos.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout(f"Deadline exceeded before requesting {url}")
+            response = self.session.request(method, url, timeout=remaining, allow_redirects=False, stream=True)
+            response.close()
+            if not response.is_redirect:
+                return response
+            url = urljoin(url, response.headers['Location'])
+        raise requests.TooManyRedirects(f"More than {MAX_REDIRECTS} redirects")
+
+    def check_url(self, url, content_types):
+        """Verifica se uma URL responde com um dos tipos de conteúdo esperados.
+
+        Args:
+            url (str): URL proposta.
+            content_types (tuple): Prefixos aceitos do Content-Type.
+
+        Returns:
+            tuple: Resultado (True, False ou None) e o motivo. Recusas do servidor (401, 403, 429) e erros
+                temporários resultam em None, pois não dizem nada sobre o valor.
+        """
+        url = url.strip()
+        if not URL_PATTERN.fullmatch(url):
+            return False, "not an http(s) URL"
+        deadline = time.monotonic() + self.timeout
+        try:
+            response = self.request('HEAD', url, deadline)
+            if response.status_code in (403, 405, 501):
+                # Alguns servidores recusam HEAD
+                response = self.request('GET', url, deadline)
+        except requests.Timeout:
+            return None, "timed out"
+        except requests.RequestException as e:
+            return None, f"request failed: {type(e).__name__}"
+        if response.status_code in UNVERIFIED_STATUS_CODES or response.status_code >= 500:
+            return None, f"HTTP {response.status_code}"
+        if response.status_code >= 400:
+            return False, f"HTTP {response.status_code}"
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type:
+            return None, "no content type"
+        if not content_type.startswith(content_types):
+            return False, f"unexpected content type {content_type}"
+        return True, ""
+
+    def validate(self, items):
+        """Valida um lote de valores.
+
+        Args:
+            items (list): Tuplas (campo, valor), em que o campo é a chave do país, como 'population' ou 'flag_image'.
+
+        Returns:
+            list: Tuplas (resultado, motivo) na ordem dos itens; campos desconhecidos recebem None.
+        """
+        results = [(None, "unknown field")] * len(items)
+        positions_by_field = {}
+        for position, (field, _) in enumerate(items):
+            if field:
+                positions_by_field.setdefault(field, []).append(position)
+        url_positions = []
+        for field, positions in positions_by_field.items():
+            values = [items[position][1] for position in positions]
+            if field in URL_FIELDS:
+                url_positions.extend(positions)
+                continue
+            if field == 'population':
+                field_results = check_populations(values)
+            elif field in ENUM_FIELDS:
+                field_results = check_enumerated(values, ENUM_FIELDS[field])
+            else:
+                field_results = check_texts(values)
+            for position, result in zip(positions, field_results):
+                results[position] = result
+        if url_positions:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                url_results = executor.map(lambda position: self.check_url(items[position][1], URL_FIELDS[items[position][0]]), url_positions)
+                for position, result in zip(url_positions, url_results):
+                    results[position] = result
+        return results